@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+
+__author__ = 'Pranav Marla'
+
+
+# Plans many inputs (or many what-if scenarios of the same input) in parallel, saving one output file per input/scenario.
+#
+# Eg. To plan several input files:
+#   ./batch.py team-a.json team-b.json team-c.json --output-dir results
+#
+# Eg. To plan several what-if scenarios of the same input, given a scenarios file like this:
+#   {
+#       "input": "backlog.json",
+#       "scenarios":
+#       [
+#           {"name": "more-capacity", "capacity_multiplier": 1.2},
+#           {"name": "bob-on-vacation", "assignee_capacities": {"bob": 0}},
+#           {"name": "x-first", "stories": {"X": {"importance": 10}}}
+#       ]
+#   }
+#   ./batch.py --scenarios scenarios.json --output-dir results
+#
+# Scenario overrides (all optional):
+#   capacity_multiplier: multiply the capacity (and every assignee's capacity) of every sprint by this number
+#   assignee_capacities: dictionary mapping assignee to their new capacity in every sprint
+#   stories: dictionary mapping story ID to a dictionary of the story's fields to change (eg. importance, size, end_date)
+#
+# The output files are named after the input file (or the scenario) -- eg. results/team-a-output.json, results/more-capacity-output.json
+
+
+import argparse
+import copy
+import json
+import lib
+import multiprocessing
+import os
+import writers
+
+
+# State shared by every scenario of the same base input.
+# It is set up in the main process before the worker processes are started so that, where processes are forked (eg. Linux), the workers inherit it (copy-on-write) instead of each having to parse and normalize the base input all over again.
+base_input_dict = None
+base_planner = None
+
+
+def load_base_input(base_input_file_path):
+
+    global base_input_dict, base_planner
+
+    base_input_dict = lib.read_input_dict(base_input_file_path)
+    base_planner = lib.Planner(*lib.load_story_data(base_input_dict))
+
+
+# Worker process initializer: only needed where worker processes are not forked, and thus don't already have the base input loaded
+def initialize_worker(base_input_file_path):
+    if base_input_file_path and (base_input_dict is None):
+        load_base_input(base_input_file_path)
+
+
+# Given an input dictionary and a scenario, return a new input dictionary with the scenario's overrides applied (the original input dictionary is left untouched)
+def apply_scenario(input_dict, scenario):
+
+    input_dict = copy.deepcopy(input_dict)
+
+    capacity_multiplier = scenario.get('capacity_multiplier')
+    assignee_capacities = scenario.get('assignee_capacities', {})
+
+    for sprint_dict in input_dict['sprints']:
+
+        sprint_assignee_capacities = sprint_dict.setdefault('assignee_capacities', {})
+
+        if capacity_multiplier is not None:
+            sprint_dict['capacity'] *= capacity_multiplier
+            for assignee in sprint_assignee_capacities:
+                sprint_assignee_capacities[assignee] *= capacity_multiplier
+
+        sprint_assignee_capacities.update(assignee_capacities)
+
+        # Keep the input the same as before for sprints that don't have any assignee capacities
+        if not sprint_assignee_capacities:
+            del sprint_dict['assignee_capacities']
+
+    id_to_story_overrides_dict = scenario.get('stories', {})
+    for story_dict in input_dict['stories']:
+        story_dict.update(id_to_story_overrides_dict.get(story_dict['id'], {}))
+
+    unknown_story_ids = set(id_to_story_overrides_dict).difference(story_dict['id'] for story_dict in input_dict['stories'])
+    if unknown_story_ids:
+        raise ValueError('Scenario {} overrides stories that are not in the input: {}'.format(scenario['name'], sorted(unknown_story_ids)))
+
+    return input_dict
+
+
+# Worker function: plan a single input file, and save its output file.
+# Returns the path of the output file.
+def plan_input_file(input_file_path, output_file_path):
+
+    input_dict = lib.read_input_dict(input_file_path)
+    sprints = lib.load_sprint_data(input_dict)[0]
+    planner = lib.Planner(*lib.load_story_data(input_dict))
+
+    save_output(output_file_path, sprints, planner.plan(sprints))
+    return output_file_path
+
+
+# Worker function: plan a single scenario of the base input, and save its output file.
+# Returns the path of the output file.
+def plan_scenario(scenario, output_file_path):
+
+    input_dict = apply_scenario(base_input_dict, scenario)
+    sprints = lib.load_sprint_data(input_dict)[0]
+
+    # Scenarios that don't change any stories can reuse the base input's (already normalized and sorted) stories
+    if scenario.get('stories'):
+        planner = lib.Planner(*lib.load_story_data(input_dict))
+    else:
+        planner = base_planner
+
+    save_output(output_file_path, sprints, planner.plan(sprints))
+    return output_file_path
+
+
+def save_output(output_file_path, sprints, remaining_stories):
+    writers.save_output(output_file_path, sprints, remaining_stories)
+
+
+def parse_command_line_args():
+
+    arg_parser = argparse.ArgumentParser(argument_default='')
+
+    arg_parser.add_argument('inputs', nargs='*', help='Input files to plan (each one is planned separately)')
+    arg_parser.add_argument('--scenarios', help='File describing what-if scenarios: a base input file plus, for each scenario, the overrides to apply to it')
+    arg_parser.add_argument('--output-dir', help='Directory to save the output files in (default: the current directory)')
+    arg_parser.add_argument('--workers', type=int, default=0, help='Number of worker processes (default: the number of CPUs)')
+
+    args = arg_parser.parse_args()
+
+    # For safety, remove any extraneous whitespace
+    return \
+        (
+            [input_file_path.strip() for input_file_path in args.inputs],
+            args.scenarios.strip(),
+            args.output_dir.strip() or '.',
+            args.workers
+        )
+
+
+def main():
+
+    input_file_paths, scenarios_file_path, output_dir_path, num_workers = parse_command_line_args()
+
+    if not (input_file_paths or scenarios_file_path):
+        raise ValueError('No input files or scenarios file provided!')
+
+    os.makedirs(output_dir_path, exist_ok=True)
+
+    # List of (worker function, arguments) pairs, one for each output file
+    tasks = []
+
+    for input_file_path in input_file_paths:
+        input_name = os.path.splitext(os.path.basename(input_file_path))[0]
+        tasks.append((plan_input_file, (input_file_path, os.path.join(output_dir_path, '{}-output.json'.format(input_name)))))
+
+    base_input_file_path = ''
+    if scenarios_file_path:
+
+        with open(scenarios_file_path) as scenarios_file:
+            scenarios_dict = json.load(scenarios_file)
+
+        # Relative paths are relative to the scenarios file
+        base_input_file_path = os.path.join(os.path.dirname(scenarios_file_path), scenarios_dict['input'])
+        load_base_input(base_input_file_path)
+
+        for scenario in scenarios_dict['scenarios']:
+            tasks.append((plan_scenario, (scenario, os.path.join(output_dir_path, '{}-output.json'.format(scenario['name'])))))
+
+    # Make sure no two tasks overwrite each other's output file
+    output_file_paths = [args[-1] for function, args in tasks]
+    if len(set(output_file_paths)) != len(output_file_paths):
+        raise ValueError('Every input file and scenario must have a different name!')
+
+    # Fork where possible, so that the workers inherit the base input that's already been loaded
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    with context.Pool(num_workers or None, initializer=initialize_worker, initargs=(base_input_file_path,)) as pool:
+        results = [pool.apply_async(function, args) for function, args in tasks]
+        for result in results:
+            print('Saved {}'.format(result.get()))
+
+
+if __name__ == '__main__':
+    main()
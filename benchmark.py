@@ -0,0 +1,244 @@
+#! /usr/bin/env python3
+
+__author__ = 'Pranav Marla'
+
+
+# Benchmarks each phase of the planning pipeline on synthetic backlogs of increasing size, to catch performance regressions long before real backlogs get that big.
+#
+# Eg. Time backlogs of 1,000, 10,000 and 100,000 stories, and save the results as the baselines to compare future runs against:
+#   ./benchmark.py --sizes 1000,10000,100000 --save-baselines
+#
+# Eg. Compare against the saved baselines (flagging any phase that got more than 1.5x slower, and any plan that changed):
+#   ./benchmark.py --sizes 1000,10000,100000
+#
+# The backlogs are generated from a fixed seed, so the same arguments always generate the exact same backlog (and thus the exact same plan).
+
+
+import argparse
+from datetime import timedelta
+import hashlib
+import json
+import lib
+import os
+import random
+import tempfile
+import time
+
+
+# Names of the phases that are timed, in the order they run
+PHASES = ('load_input_data', 'populate_children_from_ids', 'normalize_stories', 'sort_stories', 'slot_stories')
+
+# Phases that got slower than their baseline by less than this many seconds are never flagged as regressions, since tiny timings are mostly noise
+MIN_REGRESSION_SECONDS = 0.005
+
+
+# Generate the dictionary for a synthetic input file (i.e. in the same format as the files in test-inputs), with:
+#   num_stories: Number of stories
+#   num_sprints: Number of (2 week) sprints
+#   num_assignees: Number of people who the stories are assigned to (a third of the stories are left unassigned)
+#   max_depth: Max length of any chain of dependencies (1 means that there are no dependencies)
+#   max_fan_out: Max number of stories that any single story is a prerequisite for
+#   date_window_tightness: Between 0 and 1 -- the higher it is, the more stories have start/end dates, and the narrower those date windows are
+#   seed: Seed for the random number generator
+def generate_input_dict(num_stories, num_sprints, num_assignees=10, max_depth=5, max_fan_out=3, date_window_tightness=0.2, seed=0, first_sprint_start_date=lib.convert_str_to_date('2020-01-06'), sprint_length=timedelta(days=14)):
+
+    rng = random.Random(seed)
+    assignees = ['assignee{}'.format(i) for i in range(num_assignees)]
+    story_sizes = (1, 2, 3, 5, 8)
+
+    # Give each sprint enough capacity for roughly the average story size times the number of stories per sprint, so that the last few sprints are where the backlog starts to run out of space
+    average_story_size = sum(story_sizes) / len(story_sizes)
+    sprint_capacity = round(average_story_size * num_stories / max(num_sprints, 1) * 0.9)
+
+    sprint_dicts = []
+    for sprint_number in range(num_sprints):
+
+        start_date = first_sprint_start_date + sprint_length * sprint_number
+        sprint_dict = \
+            {
+                'name': 'Sprint {}'.format(sprint_number + 1),
+                'start_date': str(start_date),
+                'end_date': str(start_date + sprint_length - timedelta(days=1)),
+                'capacity': sprint_capacity
+            }
+
+        if assignees:
+            sprint_dict['assignee_capacities'] = {assignee: rng.randint(sprint_capacity // (2 * num_assignees), 2 * sprint_capacity // num_assignees) for assignee in assignees}
+
+        sprint_dicts.append(sprint_dict)
+
+    # Spread the stories over 'max_depth' levels: stories can only be prerequisites for stories in the next level, which guarantees that there are no cycles and no chains longer than 'max_depth'
+    story_ids = ['S{}'.format(i) for i in range(num_stories)]
+    levels = [rng.randrange(max(max_depth, 1)) for story_id in story_ids]
+    level_story_ids = [[] for level in range(max(max_depth, 1))]
+    for story_id, level in zip(story_ids, levels):
+        level_story_ids[level].append(story_id)
+
+    horizon_days = max(num_sprints, 1) * sprint_length.days
+    window_days = max(round(horizon_days * (1 - date_window_tightness)), sprint_length.days)
+
+    story_dicts = []
+    for story_id, level in zip(story_ids, levels):
+
+        story_dict = {'id': story_id, 'size': rng.choice(story_sizes), 'importance': rng.randint(0, 5)}
+
+        if assignees and (rng.random() < 2 / 3):
+            story_dict['assignee'] = rng.choice(assignees)
+
+        if rng.random() < date_window_tightness:
+            window_start_date = first_sprint_start_date + timedelta(days=rng.randrange(max(horizon_days - window_days, 1)))
+            story_dict['start_date'] = str(window_start_date)
+            story_dict['end_date'] = str(window_start_date + timedelta(days=window_days))
+
+        if (level + 1 < len(level_story_ids)) and level_story_ids[level + 1] and (max_fan_out > 0):
+            next_level_story_ids = level_story_ids[level + 1]
+            num_children = rng.randint(0, max_fan_out)
+            if num_children:
+                story_dict['prerequisite_for'] = sorted(set(rng.choice(next_level_story_ids) for i in range(num_children)))
+
+        story_dicts.append(story_dict)
+
+    # Shuffle the stories, so that they aren't already in a convenient order
+    rng.shuffle(story_dicts)
+
+    return {'sprints': sprint_dicts, 'stories': story_dicts}
+
+
+# Run every phase of the planning pipeline on the given input file, and return a dictionary mapping each phase to how long it took (in seconds), as well as a fingerprint of the resulting plan
+def time_phases(input_file_path):
+
+    timings = {}
+
+    start_time = time.perf_counter()
+    sprints, id_to_sprint_dict, stories, id_to_story_dict = lib.load_input_data(input_file_path)
+    timings['load_input_data'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    lib.populate_children_from_ids(stories, id_to_story_dict)
+    timings['populate_children_from_ids'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    lib.normalize_stories(stories)
+    timings['normalize_stories'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    lib.sort_stories(stories)
+    timings['sort_stories'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    remaining_stories = lib.slot_stories(stories, sprints)
+    timings['slot_stories'] = time.perf_counter() - start_time
+
+    output_json = json.dumps(lib.create_output_dict(sprints, remaining_stories))
+    plan_fingerprint = hashlib.sha256(output_json.encode()).hexdigest()
+
+    return (timings, plan_fingerprint)
+
+
+def parse_command_line_args():
+
+    arg_parser = argparse.ArgumentParser(argument_default='')
+
+    arg_parser.add_argument('--sizes', default='1000,10000', help='Comma-separated numbers of stories to benchmark (default: 1000,10000)')
+    arg_parser.add_argument('--sprints', type=int, default=0, help='Number of sprints (default: 1 for every 100 stories)')
+    arg_parser.add_argument('--assignees', type=int, default=10, help='Number of assignees (default: 10)')
+    arg_parser.add_argument('--depth', type=int, default=5, help='Max length of any chain of dependencies (default: 5)')
+    arg_parser.add_argument('--fan-out', type=int, default=3, help='Max number of stories any story is a prerequisite for (default: 3)')
+    arg_parser.add_argument('--tightness', type=float, default=0.2, help='Date window tightness, between 0 and 1 (default: 0.2)')
+    arg_parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Number of times to time each backlog, keeping the best time of each phase (default: 3)')
+    arg_parser.add_argument('--baselines', default='benchmark-baselines.json', help='File containing the baselines to compare against (default: benchmark-baselines.json)')
+    arg_parser.add_argument('--save-baselines', action='store_true', help='Save the results as the new baselines')
+    arg_parser.add_argument('--tolerance', type=float, default=1.5, help='Flag any phase that is more than this many times slower than its baseline (default: 1.5)')
+
+    args = arg_parser.parse_args()
+
+    # For safety, remove any extraneous whitespace
+    return \
+        (
+            [int(size) for size in args.sizes.split(',') if size.strip()],
+            args.sprints,
+            args.assignees,
+            args.depth,
+            args.fan_out,
+            args.tightness,
+            args.seed,
+            max(args.repeat, 1),
+            args.baselines.strip(),
+            bool(args.save_baselines),
+            args.tolerance
+        )
+
+
+def main():
+
+    sizes, num_sprints, num_assignees, max_depth, max_fan_out, date_window_tightness, seed, num_repeats, baselines_file_path, save_baselines, tolerance = parse_command_line_args()
+
+    if os.path.exists(baselines_file_path):
+        with open(baselines_file_path) as baselines_file:
+            baselines_dict = json.load(baselines_file)
+    else:
+        baselines_dict = {}
+
+    num_regressions = 0
+
+    print('{:>10}  {:<28}{:>10}{:>12}{:>9}'.format('Stories', 'Phase', 'Seconds', 'Baseline', 'Ratio'))
+
+    for num_stories in sizes:
+
+        input_dict = generate_input_dict(num_stories, num_sprints or max(num_stories // 100, 1), num_assignees, max_depth, max_fan_out, date_window_tightness, seed)
+
+        # Every combination of generator arguments gets its own baselines
+        benchmark_key = 'stories={},sprints={},assignees={},depth={},fan_out={},tightness={},seed={}'.format(num_stories, len(input_dict['sprints']), num_assignees, max_depth, max_fan_out, date_window_tightness, seed)
+
+        with tempfile.TemporaryDirectory() as temp_dir_path:
+            input_file_path = os.path.join(temp_dir_path, 'input.json')
+            with open(input_file_path, 'w') as input_file:
+                json.dump(input_dict, input_file)
+            del input_dict
+
+            # Use the best time of each phase over several repeats, to reduce the noise from whatever else the machine is doing
+            timings = {}
+            for repeat_number in range(num_repeats):
+                repeat_timings, plan_fingerprint = time_phases(input_file_path)
+                for phase, seconds in repeat_timings.items():
+                    timings[phase] = min(seconds, timings.get(phase, seconds))
+
+        baseline_dict = baselines_dict.get(benchmark_key)
+
+        for phase in PHASES:
+
+            if baseline_dict:
+                baseline = baseline_dict['timings'][phase]
+                ratio = timings[phase] / baseline if baseline else 1
+                is_regression = (ratio > tolerance) and (timings[phase] - baseline > MIN_REGRESSION_SECONDS)
+                num_regressions += is_regression
+                print('{:>10}  {:<28}{:>10.4f}{:>12.4f}{:>8.2f}x{}'.format(num_stories, phase, timings[phase], baseline, ratio, '  <-- REGRESSION' if is_regression else ''))
+            else:
+                print('{:>10}  {:<28}{:>10.4f}{:>12}{:>9}'.format(num_stories, phase, timings[phase], '-', '-'))
+
+        print('{:>10}  {:<28}{:>10.4f}'.format(num_stories, 'total', sum(timings.values())))
+
+        # The same backlog must always produce the same plan, so a different plan means that the planning logic itself changed
+        if baseline_dict and (baseline_dict['plan_fingerprint'] != plan_fingerprint):
+            num_regressions += 1
+            print('{:>10}  PLAN CHANGED (the plan no longer matches the baseline plan)'.format(num_stories))
+
+        print()
+
+        if save_baselines:
+            baselines_dict[benchmark_key] = {'timings': timings, 'plan_fingerprint': plan_fingerprint}
+
+    if save_baselines:
+        with open(baselines_file_path, 'w') as baselines_file:
+            baselines_file.write(json.dumps(baselines_dict, indent=4, sort_keys=True))
+        print('Saved baselines to {}'.format(baselines_file_path))
+
+    if num_regressions:
+        print('{} regression(s) found!'.format(num_regressions))
+
+    return num_regressions
+
+
+if __name__ == '__main__':
+    raise SystemExit(1 if main() else 0)
@@ -0,0 +1,304 @@
+__author__ = 'Pranav Marla'
+
+
+# On-disk cache of preprocessed inputs: the stories after populating their children, normalizing and sorting them (i.e. everything that happens before slotting), so that re-planning an input that hasn't changed skips all of that work.
+#
+# The cache directory contains two kinds of files:
+#   <input hash>.input:   The sprints of an input file (as JSON), plus the hash of its stories -- found by hashing the raw bytes of the input file, without having to parse it
+#   <stories hash>.plan:  The preprocessed stories, in the binary format described below -- shared by every input file with the same stories (eg. inputs that only differ in their sprints' capacities)
+#
+# Entries never need to be explicitly invalidated, since any change to an input changes its hash (and CACHE_FORMAT_VERSION is part of every hash, so bump it whenever preprocessing changes).
+# Entries that can't be read (eg. a partially written file) are deleted and rebuilt.
+# Whenever the directory grows past its max size, the least recently used entries are deleted.
+#
+# .plan file format (all numbers in native byte order), designed to be memory-mapped and read one column at a time:
+#   Header (see PLAN_HEADER_STRUCT): magic, format version, typecode of the sizes column, typecode of the importances column, number of stories, number of child links, length of the strings section
+#   Columns, one value per story, in sorted order: sizes, importances, start dates, end dates (day ordinals), assignee codes (position in the assignees list, where 0 is no assignee)
+#   Children (in compressed sparse row form): child_starts (number of stories + 1 values), then child positions -- the children of story i are at positions child_positions[child_starts[i]:child_starts[i + 1]]
+#   Strings section: UTF-8 JSON dictionary of the story IDs, story names and assignees, which keeps them exactly as they were in the input (eg. numeric IDs stay numbers)
+
+
+from array import array
+import hashlib
+import json
+import lib
+import mmap
+import os
+import struct
+import sys
+
+
+# Bump this whenever preprocessing (or the .plan format) changes, so that older entries are never used
+CACHE_FORMAT_VERSION = 1
+
+# Default max total size of the cache directory
+DEFAULT_MAX_CACHE_BYTES = 1024 ** 3
+
+PLAN_MAGIC = b'SPRNTPLN'
+PLAN_HEADER_STRUCT = struct.Struct('=8sIccxxQQQ')
+
+# Typecode of every integer column
+INT_TYPECODE = 'q'
+
+
+# Return the hex digest of the given bytes, salted with everything that could make a cache entry unreadable or out of date
+def hash_bytes(data):
+    return hashlib.sha256('{}:{}:'.format(CACHE_FORMAT_VERSION, sys.byteorder).encode() + data).hexdigest()
+
+
+# Return the hash of the given list of story dictionaries (as read from an input file), which doesn't depend on the order of the keys within each story
+def hash_story_dicts(story_dicts):
+    return hash_bytes(json.dumps(story_dicts, sort_keys=True, separators=(',', ':')).encode())
+
+
+# Return the typecode to store the given numbers with, or None if they can't be stored in a single column without changing how they're printed (i.e. a mix of integers and floating point numbers)
+def find_number_typecode(numbers):
+
+    number_types = set(map(type, numbers))
+    if number_types <= {int}:
+        return INT_TYPECODE
+    if number_types == {float}:
+        return 'd'
+    return None
+
+
+# Save the given (preprocessed) stories to a .plan file.
+# Returns False, without saving anything, if the stories can't be stored in the .plan format.
+def save_plan_file(plan_file_path, stories):
+
+    sizes = [story.size for story in stories]
+    importances = [story.importance for story in stories]
+    size_typecode = find_number_typecode(sizes)
+    importance_typecode = find_number_typecode(importances)
+    if (size_typecode is None) or (importance_typecode is None):
+        return False
+
+    story_positions = {id(story): position for position, story in enumerate(stories)}
+
+    assignees = [None]
+    assignee_to_code_dict = {None: 0}
+    assignee_codes = array(INT_TYPECODE)
+    child_starts = array(INT_TYPECODE, [0])
+    child_positions = array(INT_TYPECODE)
+
+    for story in stories:
+
+        assignee_code = assignee_to_code_dict.get(story.assignee)
+        if assignee_code is None:
+            assignee_code = assignee_to_code_dict[story.assignee] = len(assignees)
+            assignees.append(story.assignee)
+        assignee_codes.append(assignee_code)
+
+        # Children are always in the list of stories, unless the stories were preprocessed from something other than a whole input
+        for child in story.children:
+            if id(child) not in story_positions:
+                return False
+            child_positions.append(story_positions[id(child)])
+        child_starts.append(len(child_positions))
+
+    strings_bytes = json.dumps({'ids': [story.id for story in stories], 'names': [story.name for story in stories], 'assignees': assignees}).encode()
+
+    # Integers too big for 64 bits can't be stored either
+    try:
+        columns = \
+            (
+                array(size_typecode, sizes),
+                array(importance_typecode, importances),
+                array(INT_TYPECODE, [story.start_date for story in stories]),
+                array(INT_TYPECODE, [story.end_date for story in stories]),
+                assignee_codes,
+                child_starts,
+                child_positions
+            )
+    except OverflowError:
+        return False
+
+    # Write to a temporary file first, so that other processes never see a partially written file
+    temp_file_path = '{}.{}.tmp'.format(plan_file_path, os.getpid())
+    with open(temp_file_path, 'wb') as plan_file:
+        plan_file.write(PLAN_HEADER_STRUCT.pack(PLAN_MAGIC, CACHE_FORMAT_VERSION, size_typecode.encode(), importance_typecode.encode(), len(stories), len(child_positions), len(strings_bytes)))
+        for column in columns:
+            column.tofile(plan_file)
+        plan_file.write(strings_bytes)
+    os.replace(temp_file_path, plan_file_path)
+
+    return True
+
+
+# Load the preprocessed stories from a .plan file, as a list of Story objects that are ready to be slotted (i.e. with their children populated, normalized and sorted).
+# Raises ValueError if the file isn't a valid .plan file.
+def load_plan_file(plan_file_path):
+
+    with open(plan_file_path, 'rb') as plan_file:
+        with mmap.mmap(plan_file.fileno(), 0, access=mmap.ACCESS_READ) as plan_mmap:
+            with memoryview(plan_mmap) as plan_view:
+
+                if len(plan_view) < PLAN_HEADER_STRUCT.size:
+                    raise ValueError('{} is not a valid plan file!'.format(plan_file_path))
+
+                magic, version, size_typecode, importance_typecode, num_stories, num_child_links, strings_length = PLAN_HEADER_STRUCT.unpack_from(plan_view)
+                size_typecode = size_typecode.decode('ascii', 'replace')
+                importance_typecode = importance_typecode.decode('ascii', 'replace')
+
+                if (magic != PLAN_MAGIC) or (version != CACHE_FORMAT_VERSION) or (size_typecode not in ('d', INT_TYPECODE)) or (importance_typecode not in ('d', INT_TYPECODE)):
+                    raise ValueError('{} is not a valid plan file!'.format(plan_file_path))
+
+                column_lengths = \
+                    (
+                        (size_typecode, num_stories),
+                        (importance_typecode, num_stories),
+                        (INT_TYPECODE, num_stories),
+                        (INT_TYPECODE, num_stories),
+                        (INT_TYPECODE, num_stories),
+                        (INT_TYPECODE, num_stories + 1),
+                        (INT_TYPECODE, num_child_links)
+                    )
+
+                # Catches files that were cut short
+                if len(plan_view) != PLAN_HEADER_STRUCT.size + sum(array(typecode).itemsize * length for typecode, length in column_lengths) + strings_length:
+                    raise ValueError('{} is not a valid plan file!'.format(plan_file_path))
+
+                columns = []
+                offset = PLAN_HEADER_STRUCT.size
+                for typecode, length in column_lengths:
+                    end_offset = offset + array(typecode).itemsize * length
+                    with plan_view[offset:end_offset] as column_view:
+                        with column_view.cast(typecode) as column:
+                            columns.append(column.tolist())
+                    offset = end_offset
+
+                strings_dict = json.loads(plan_view[offset:].tobytes().decode())
+
+    sizes, importances, start_dates, end_dates, assignee_codes, child_starts, child_positions = columns
+    assignees = strings_dict['assignees']
+
+    stories = [lib.Story(story_id, name, size, importance, start_date, end_date, assignees[assignee_code]) for story_id, name, size, importance, start_date, end_date, assignee_code in zip(strings_dict['ids'], strings_dict['names'], sizes, importances, start_dates, end_dates, assignee_codes)]
+
+    for position, story in enumerate(stories):
+        child_start = child_starts[position]
+        child_end = child_starts[position + 1]
+        if child_start != child_end:
+            story.children = [stories[child_position] for child_position in child_positions[child_start:child_end]]
+            story.children_ids = [child.id for child in story.children]
+
+    return stories
+
+
+# Load the given input file, using (or, if necessary, updating) the cache in the given directory.
+# Returns the sprints, the dictionary mapping sprint ID to sprint, the list of stories -- already populated with their children, normalized and sorted -- and whether the stories came from the cache.
+def load_preprocessed_input(input_file_path, cache_dir_path, max_cache_bytes=DEFAULT_MAX_CACHE_BYTES):
+
+    # No input file path argument was provided, or a blank string was provided
+    if not input_file_path:
+        raise ValueError('No input file path provided!')
+
+    os.makedirs(cache_dir_path, exist_ok=True)
+
+    with open(input_file_path, 'rb') as input_file:
+        input_hash = hash_bytes(input_file.read())
+    input_entry_file_path = os.path.join(cache_dir_path, input_hash + '.input')
+
+    # Fast path: the exact same input file has been seen before, so there's no need to even parse it
+    input_entry_dict = read_cache_entry(input_entry_file_path, load_input_entry_file)
+    if input_entry_dict is not None:
+        plan_file_path = os.path.join(cache_dir_path, input_entry_dict['stories_hash'] + '.plan')
+        stories = read_cache_entry(plan_file_path, load_plan_file)
+        if stories is not None:
+            sprints, id_to_sprint_dict = lib.load_sprint_data(input_entry_dict)
+            return (sprints, id_to_sprint_dict, stories, True)
+
+    input_dict = lib.read_input_dict(input_file_path)
+    sprints, id_to_sprint_dict = lib.load_sprint_data(input_dict)
+
+    # The input file changed, but maybe only its sprints did
+    stories_hash = hash_story_dicts(input_dict['stories'])
+    plan_file_path = os.path.join(cache_dir_path, stories_hash + '.plan')
+    stories = read_cache_entry(plan_file_path, load_plan_file)
+    is_cache_hit = stories is not None
+
+    if not is_cache_hit:
+
+        stories, id_to_story_dict = lib.load_story_data(input_dict)
+        lib.populate_children_from_ids(stories, id_to_story_dict)
+        lib.normalize_stories(stories)
+        lib.sort_stories(stories)
+
+        if not save_plan_file(plan_file_path, stories):
+            return (sprints, id_to_sprint_dict, stories, False)
+
+    save_json_file(input_entry_file_path, {'sprints': input_dict['sprints'], 'stories_hash': stories_hash})
+    evict_cache_entries(cache_dir_path, max_cache_bytes, keep_file_paths=(input_entry_file_path, plan_file_path))
+
+    return (sprints, id_to_sprint_dict, stories, is_cache_hit)
+
+
+# Read a cache entry with the given function, marking it as recently used.
+# Returns None if the entry doesn't exist, or if it can't be read (in which case it is deleted).
+def read_cache_entry(file_path, read_function):
+
+    try:
+        result = read_function(file_path)
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError, OSError):
+        remove_file(file_path)
+        return None
+
+    # Eviction goes by modification time, so this makes it least recently used, rather than least recently written
+    try:
+        os.utime(file_path)
+    except OSError:
+        pass
+
+    return result
+
+
+# Read an .input entry, making sure it has everything that load_preprocessed_input() needs from it (so that an incomplete entry is a cache miss, rather than an error)
+def load_input_entry_file(input_entry_file_path):
+
+    input_entry_dict = json_load_file(input_entry_file_path)
+    if not isinstance(input_entry_dict['stories_hash'], str) or not isinstance(input_entry_dict['sprints'], list):
+        raise ValueError('Malformed cache entry {}'.format(input_entry_file_path))
+
+    return input_entry_dict
+
+
+def json_load_file(file_path):
+    with open(file_path) as json_file:
+        return json.load(json_file)
+
+
+def save_json_file(file_path, data):
+
+    temp_file_path = '{}.{}.tmp'.format(file_path, os.getpid())
+    with open(temp_file_path, 'w') as json_file:
+        json.dump(data, json_file, separators=(',', ':'))
+    os.replace(temp_file_path, file_path)
+
+
+def remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+# Delete the least recently used entries in the cache directory until it is no bigger than 'max_cache_bytes' (never deleting the given files, which were just used)
+def evict_cache_entries(cache_dir_path, max_cache_bytes, keep_file_paths=()):
+
+    entries = []
+    for entry in os.scandir(cache_dir_path):
+        if entry.is_file() and entry.name.endswith(('.input', '.plan')):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.path, stat.st_size))
+
+    total_bytes = sum(size for mtime, path, size in entries)
+
+    for mtime, path, size in sorted(entries):
+
+        if total_bytes <= max_cache_bytes:
+            break
+
+        if path not in keep_file_paths:
+            remove_file(path)
+            total_bytes -= size
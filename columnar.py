@@ -0,0 +1,327 @@
+__author__ = 'Pranav Marla'
+
+
+# Optional, array-backed alternative to lib.py's Story objects, for inputs with millions of stories.
+# Instead of one Story object per story, every story attribute is stored in its own NumPy array (i.e. one column per attribute, one row per story), so that normalizing and sorting can be done on whole arrays at once.
+# Results are the same as those of lib.normalize_stories(), lib.sort_stories() and lib.slot_stories() -- objects are only created for the stories in the final output, and only with the attributes needed for output.
+
+
+import json
+import lib
+
+# NumPy is only needed for this (optional) backend, so don't require it to be installed unless this backend is actually used
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class StoryColumns:
+
+    def __init__(self):
+
+        if np is None:
+            raise ImportError('The columnar backend requires NumPy to be installed (eg. pip install numpy)!')
+
+        # Until finish() is called, each column is a regular list that we append to as stories are added.
+        # Story IDs and names are only needed for output, so they are always kept as regular lists.
+        self.ids = []
+        self.names = []
+        self.sizes = []
+        self.importances = []
+
+        # Dates are day ordinals (just like in lib.py), so they can be stored in, and compared as, integer arrays
+        self.start_ordinals = []
+        self.end_ordinals = []
+
+        # Each assignee is stored as an integer code, which is its position in 'self.assignees'.
+        # Code 0 means that the story is not assigned to anyone.
+        self.assignees = [None]
+        self.assignee_codes = []
+        self._assignee_to_code_dict = {None: 0}
+
+        # The children of the story in row i are the stories in rows self.child_rows[self.child_row_starts[i]:self.child_row_starts[i + 1]]
+        # (i.e. the compressed sparse row (CSR) representation of the dependency graph)
+        # Until finish() is called, 'self.child_rows' holds the children's IDs, rather than their rows.
+        self.child_row_starts = [0]
+        self.child_rows = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Add the story described by the given dictionary (as found in the input file) as a new row
+    def add_story(self, story_dict, min_date=lib.MIN_DATE, max_date=lib.MAX_DATE):
+
+        size = story_dict.get('size', 1)
+
+        # Size accepts all non-negative values, including 0 and floating point numbers.
+        if size < 0:
+            raise ValueError("Story {} has a size of {}: Story sizes have to be >= 0!".format(story_dict['id'], size))
+
+        if 'start_date' in story_dict:
+            start_date = lib.convert_str_to_day(story_dict['start_date'])
+        else:
+            start_date = min_date
+
+        if 'end_date' in story_dict:
+            end_date = lib.convert_str_to_day(story_dict['end_date'])
+        else:
+            end_date = max_date
+
+        assignee = story_dict.get('assignee')
+        assignee_code = self._assignee_to_code_dict.get(assignee)
+        if assignee_code is None:
+            assignee_code = self._assignee_to_code_dict[assignee] = len(self.assignees)
+            self.assignees.append(assignee)
+
+        self.ids.append(story_dict['id'])
+        self.names.append(story_dict.get('name'))
+        self.sizes.append(size)
+        self.importances.append(story_dict.get('importance', 0))
+        self.start_ordinals.append(start_date)
+        self.end_ordinals.append(end_date)
+        self.assignee_codes.append(assignee_code)
+
+        self.child_rows.extend(story_dict.get('prerequisite_for', ()))
+        self.child_row_starts.append(len(self.child_rows))
+
+    # Call this once all the stories have been added, to convert each column into a NumPy array
+    def finish(self):
+
+        # Dictionary mapping story ID (a string) to its row.
+        # As with lib.load_story_data(), if multiple stories share the same ID, the last one wins.
+        id_to_row_dict = {story_id: row for row, story_id in enumerate(self.ids)}
+
+        # A NumPy array turns every size into a float if any of them is one, so the sizes are kept as they were given (just like lib.py's Story objects) for slotting and output, and the array is only used for sorting
+        self.size_values = self.sizes
+        self.sizes = np.array(self.sizes)
+        self.importances = np.array(self.importances)
+        self.start_ordinals = np.array(self.start_ordinals, dtype=np.int64)
+        self.end_ordinals = np.array(self.end_ordinals, dtype=np.int64)
+        self.assignee_codes = np.array(self.assignee_codes, dtype=np.int64)
+        self.child_row_starts = np.array(self.child_row_starts, dtype=np.int64)
+        self.child_rows = np.array([id_to_row_dict[child_id] for child_id in self.child_rows], dtype=np.int64)
+
+    # Equivalent to lib.normalize_stories(): ensure that each story's importance is >= the max of its children's importances, and that its end date is <= (the min of its children's end dates - 1 day).
+    # Stories are normalized one topological level at a time (first all the stories with no children, then all the stories whose children have all been normalized, etc.), and each level is normalized with whole-array operations.
+    def normalize(self, one_day=lib.ONE_DAY, min_ordinal=lib.MIN_DATE):
+
+        num_stories = len(self)
+        child_row_starts = self.child_row_starts
+        child_rows = self.child_rows
+        num_children = np.diff(child_row_starts)
+
+        # Reverse the dependency graph (in CSR form as well), so that we can find each story's parents
+        parent_rows = np.repeat(np.arange(num_stories, dtype=np.int64), num_children)[np.argsort(child_rows, kind='stable')]
+        parent_row_starts = np.zeros(num_stories + 1, dtype=np.int64)
+        np.cumsum(np.bincount(child_rows, minlength=num_stories), out=parent_row_starts[1:])
+
+        # num_pending_children[i] is the number of links from story i to its children that have not been normalized yet
+        num_pending_children = num_children.copy()
+
+        # Stories that are not waiting on any children, and are thus ready to be normalized
+        ready_rows = np.flatnonzero(num_pending_children == 0)
+        num_normalized_stories = 0
+
+        while ready_rows.size:
+
+            num_normalized_stories += ready_rows.size
+
+            # Stories with no children are already normalized by default
+            rows = ready_rows[num_children[ready_rows] > 0]
+            if rows.size:
+
+                # All the children of these stories have been normalized by now, so use their normalized importance and end_date values to normalize these stories
+                children = child_rows[gather_ranges(child_row_starts, rows)]
+                child_group_starts = np.cumsum(num_children[rows]) - num_children[rows]
+                max_importances = np.maximum.reduceat(self.importances[children], child_group_starts)
+                min_end_ordinals = np.minimum.reduceat(self.end_ordinals[children], child_group_starts)
+
+                # Same as in lib.normalize_stories(), going back 1 day from the min possible date is an error
+                if (min_end_ordinals - one_day < min_ordinal).any():
+                    raise OverflowError('date value out of range')
+
+                self.importances[rows] = np.maximum(self.importances[rows], max_importances)
+                self.end_ordinals[rows] = np.minimum(self.end_ordinals[rows], min_end_ordinals - one_day)
+
+            # Now that these stories are normalized, their parents no longer need to wait on them
+            parents, num_links = np.unique(parent_rows[gather_ranges(parent_row_starts, ready_rows)], return_counts=True)
+            num_pending_children[parents] -= num_links
+            ready_rows = parents[num_pending_children[parents] == 0]
+
+        # If some stories are still waiting on their children, it means that there is a cycle in their dependencies, so they can never be normalized
+        if num_normalized_stories < num_stories:
+            raise ValueError('Stories have a dependency cycle: {}'.format(' -> '.join(self._find_dependency_cycle(num_pending_children))))
+
+    # Equivalent to lib.find_dependency_cycle(), given the number of pending children of each story after normalize() has done all it can
+    def _find_dependency_cycle(self, num_pending_children):
+
+        # Each story that is still waiting has at least one child that is also still waiting, so, by repeatedly following those children, we must eventually revisit a story.
+        row = int(np.flatnonzero(num_pending_children)[0])
+        path = []
+        path_positions = {}
+        while row not in path_positions:
+            path_positions[row] = len(path)
+            path.append(row)
+            children = self.child_rows[self.child_row_starts[row]:self.child_row_starts[row + 1]]
+            row = int(children[num_pending_children[children] > 0][0])
+
+        cycle = path[path_positions[row]:] + [row]
+        return [self.ids[cycle_row] for cycle_row in cycle]
+
+    # Equivalent to lib.sort_stories(), but returns the rows of the stories in sorted order, rather than sorting in place:
+    # By importance in descending order, then by end_date in ascending order, then by size in descending order.
+    # As with lib.sort_stories(), stories that are tied on all three keep their original order (np.lexsort is stable).
+    def sorted_rows(self):
+        # Note that np.lexsort sorts by the LAST key first
+        return np.lexsort((-self.sizes, self.end_ordinals, -self.importances))
+
+    # Create OutputStory objects for the stories in the given rows
+    def create_output_stories(self, rows):
+
+        sizes = self.size_values
+        assignee_codes = self.assignee_codes.tolist()
+        ids = self.ids
+        names = self.names
+        assignees = self.assignees
+
+        return [OutputStory(ids[row], names[row], sizes[row], assignees[assignee_codes[row]]) for row in rows]
+
+
+# Lightweight stand-in for a Story object, containing only what main.py needs to output a story, so that outputting millions of stories doesn't undo the memory savings of storing them in columns
+class OutputStory:
+
+    __slots__ = ('id', 'name', 'size', 'assignee', 'assigned_sprint_id')
+
+    def __init__(self, id, name, size, assignee, assigned_sprint_id=None):
+        self.id = id
+        self.name = name
+        self.size = size
+        self.assignee = assignee
+        self.assigned_sprint_id = assigned_sprint_id
+
+    def __repr__(self):
+        return 'OutputStory(id={}, name={}, size={}, assignee={}, assigned_sprint_id={})'.format(self.id, self.name, self.size, self.assignee, self.assigned_sprint_id)
+
+    # Print stories exactly like lib.Story does
+    __str__ = lib.Story.__str__
+
+
+# Given an array of CSR row start offsets and an array of rows, return the positions of all the elements of those rows, concatenated in order.
+# Eg. If row_starts = [0, 2, 2, 5] and rows = [2, 0], return [2, 3, 4, 0, 1].
+def gather_ranges(row_starts, rows):
+
+    starts = row_starts[rows]
+    lengths = row_starts[rows + 1] - starts
+
+    # For each element of the result, the offset of its row within the result
+    result_offsets = np.cumsum(lengths) - lengths
+
+    return np.repeat(starts - result_offsets, lengths) + np.arange(lengths.sum())
+
+
+# Equivalent to lib.load_input_data() (or lib.load_ndjson_input_data(), for NDJSON files), except that the stories are loaded into a StoryColumns object instead of a list of Story objects.
+def load_input_columns(input_file_path):
+
+    # No input file path argument was provided, or a blank string was provided
+    if not input_file_path:
+        raise ValueError('No input file path provided!')
+
+    story_columns = StoryColumns()
+
+    with open(input_file_path) as input_file:
+
+        if lib.is_ndjson_file(input_file_path):
+
+            lines = (line for line in input_file if not line.isspace())
+
+            header_line = next(lines, None)
+            if header_line is None:
+                raise ValueError('Input file {} is empty!'.format(input_file_path))
+            sprints, id_to_sprint_dict = lib.load_sprint_data(json.loads(header_line))
+
+            for line in lines:
+                story_columns.add_story(json.loads(line))
+
+        else:
+
+            input_dict = json.load(input_file)
+            sprints, id_to_sprint_dict = lib.load_sprint_data(input_dict)
+
+            for story_dict in input_dict['stories']:
+                story_columns.add_story(story_dict)
+
+            # Free the parsed JSON as soon as possible
+            del input_dict
+
+    story_columns.finish()
+
+    return (sprints, id_to_sprint_dict, story_columns)
+
+
+# Equivalent to lib.slot_stories(), for (normalized) stories stored in a StoryColumns object, in the order given by 'sorted_rows'.
+# Just like lib.slot_stories(), each sprint's list of stories is populated, and the list of stories that could not be slotted into any sprint is returned -- but as OutputStory objects rather than Story objects.
+def slot_story_columns(story_columns, sorted_rows, sprints, max_date=lib.MAX_DATE, profile=None):
+
+    # Slotting is inherently sequential (each story depends on what's left after the previous ones), so, for speed, use regular lists rather than indexing into NumPy arrays one element at a time.
+    sizes = story_columns.size_values
+    start_ordinals = story_columns.start_ordinals.tolist()
+    end_ordinals = story_columns.end_ordinals.tolist()
+    assignee_codes = story_columns.assignee_codes.tolist()
+    child_row_starts = story_columns.child_row_starts.tolist()
+    child_rows = story_columns.child_rows.tolist()
+    assignees = story_columns.assignees
+
+    sprint_index = lib.SprintIndex(sprints, max_date)
+    children_first_positions = sprint_index.children_first_positions
+
+    # earliest_sprint_positions[row] is the position of the earliest sprint that the story in that row may be slotted into, given the sprints its parents were slotted into (see lib.Story)
+    earliest_sprint_positions = [0] * len(story_columns)
+
+    # slotted_rows[i] contains the rows of the stories slotted into sprints[i], in the order they were slotted
+    slotted_rows = [[] for sprint in sprints]
+    is_slotted = [False] * len(story_columns)
+
+    # Number of times a child's earliest sprint position had to be moved later, to keep it from being slotted before its parent
+    num_child_sprint_position_adjustments = 0
+
+    sorted_rows = sorted_rows.tolist()
+    for row in sorted_rows:
+
+        position = lib.slot_story(sizes[row], start_ordinals[row], end_ordinals[row], assignees[assignee_codes[row]], sprints, sprint_index, profile, earliest_sprint_positions[row])
+
+        if position is not None:
+            slotted_rows[position].append(row)
+            is_slotted[row] = True
+
+        # If all the sprints are full, don't bother trying to slot the remaining stories
+        if not sprint_index.num_available_sprints:
+            break
+
+        # Same as in lib.slot_stories(), ensure that this story's children cannot be slotted into a sprint before this story's sprint (or into any sprint at all, if this story could not be slotted)
+        children_first_position = children_first_positions[len(sprints) if position is None else position]
+        for child_row in child_rows[child_row_starts[row]:child_row_starts[row + 1]]:
+            if earliest_sprint_positions[child_row] < children_first_position:
+                earliest_sprint_positions[child_row] = children_first_position
+                num_child_sprint_position_adjustments += 1
+
+    # Create all the output stories at once (so that the columns only need to be converted once), in the order: each sprint's stories, followed by the remaining stories (in sorted order)
+    remaining_rows = [row for row in sorted_rows if not is_slotted[row]]
+    output_stories = story_columns.create_output_stories([row for rows in slotted_rows for row in rows] + remaining_rows)
+
+    num_output_stories = 0
+    for sprint, rows in zip(sprints, slotted_rows):
+        for story in output_stories[num_output_stories:num_output_stories + len(rows)]:
+            story.assigned_sprint_id = sprint.id
+            sprint.stories.append(story)
+        num_output_stories += len(rows)
+
+    # Every story that was not slotted is remaining, in sorted order
+    remaining_stories = output_stories[num_output_stories:]
+
+    if profile is not None:
+        profile.count('stories_slotted', num_output_stories)
+        profile.count('stories_not_slotted', len(remaining_stories))
+        profile.count('child_sprint_position_adjustments', num_child_sprint_position_adjustments)
+
+    return remaining_stories
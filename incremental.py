@@ -0,0 +1,267 @@
+__author__ = 'Pranav Marla'
+
+
+# Incremental re-planning: given the input file that a previous plan was made from, that previous plan (i.e. its output file) and a delta describing the stories that have changed since then, produce exactly the same plan that a full run on the updated input would, while redoing as little of the work as possible.
+#
+# The delta file looks like this (both keys are optional):
+#   {
+#       "stories": [ <stories that were changed (given in full, exactly as they now appear in the input) or added> ],
+#       "removed": [ <IDs of stories that were removed> ]
+#   }
+#
+# Changed stories keep their place in the input's list of stories, and added stories are appended to the end of that list (this matters for stories that are sorted as equals).
+# Sprints cannot be changed by a delta, since every sprint affects where every story goes -- do a full run instead.
+#
+# Re-planning incrementally also needs the order that the previous plan slotted the stories in, along with their normalized values -- working those out again would take as long as a full run does.
+# So, along with its output file, every full run saves them to an order file (see get_order_file_path()), which re-planning reads back in, eg.
+#   ./main.py --input backlog.json
+#   ./main.py --input backlog.json --delta delta.json
+# The order file is only valid for the exact input file that it was made from, and re-planning overwrites the previous output file by default -- so to re-plan again after that, make a full run of the updated input first.
+#
+# For example, with test-inputs/delta-previous.json (whose plan is test-inputs/delta-previous-output.json, with its order file) and the delta test-inputs/delta-changes.json, the re-plan is test-inputs/delta-output.json -- the same as a full run on the updated input.
+
+
+from collections import defaultdict
+import hashlib
+import json
+import lib
+import os
+
+
+# Extension of the order file that is saved next to each output file
+ORDER_FILE_EXTENSION = '.order.json'
+
+# Number of bytes of the input file to hash at a time
+HASH_CHUNK_SIZE = 1 << 20
+
+
+# Given a dictionary read from an input file and a dictionary read from a delta file, return a new input dictionary with the delta applied
+def apply_delta(input_dict, delta_dict):
+
+    if 'sprints' in delta_dict:
+        raise ValueError('A delta cannot change the sprints -- do a full run instead!')
+
+    # Dictionary mapping story ID to the new description of that story
+    id_to_delta_story_dict = {story_dict['id']: story_dict for story_dict in delta_dict.get('stories', [])}
+
+    removed_story_ids = set(delta_dict.get('removed', []))
+    if not removed_story_ids.isdisjoint(id_to_delta_story_dict):
+        raise ValueError('Stories {} cannot be both changed and removed by the same delta!'.format(sorted(removed_story_ids.intersection(id_to_delta_story_dict))))
+
+    story_dicts = []
+    for story_dict in input_dict['stories']:
+
+        story_id = story_dict['id']
+        if story_id in removed_story_ids:
+            continue
+
+        # If the story was changed, use its new description (and remove it from the dictionary, so that only the added stories are left in it)
+        story_dicts.append(id_to_delta_story_dict.pop(story_id, story_dict))
+
+    story_dicts.extend(id_to_delta_story_dict.values())
+
+    new_input_dict = dict(input_dict)
+    new_input_dict['stories'] = story_dicts
+    return new_input_dict
+
+
+# Return the set of IDs of the stories whose normalized values might be different because of the delta: the stories changed, added or removed by the delta, plus all their ancestors (i.e. all the stories that directly or indirectly depend on them).
+# 'story_dicts' contains the descriptions of the stories after the delta has been applied.
+def find_affected_story_ids(story_dicts, delta_dict):
+
+    # Dictionary mapping story ID to the IDs of the stories it is a prerequisite for
+    id_to_parent_ids_dict = defaultdict(list)
+    for story_dict in story_dicts:
+        for child_id in story_dict.get('prerequisite_for', ()):
+            id_to_parent_ids_dict[child_id].append(story_dict['id'])
+
+    # Note: Parents of removed stories are included as well, so that, just like in a full run, any remaining dependencies on removed stories are reported as errors.
+    pending_story_ids = [story_dict['id'] for story_dict in delta_dict.get('stories', [])] + list(delta_dict.get('removed', []))
+    affected_story_ids = set(pending_story_ids)
+
+    while pending_story_ids:
+        for parent_id in id_to_parent_ids_dict.get(pending_story_ids.pop(), ()):
+            if parent_id not in affected_story_ids:
+                affected_story_ids.add(parent_id)
+                pending_story_ids.append(parent_id)
+
+    return affected_story_ids
+
+
+# Given a dictionary read from a plan's output file, return a dictionary mapping the ID of each story in that plan to the ID of the sprint it was slotted into (or None, if it was not slotted).
+def read_story_sprint_ids(output_dict):
+
+    id_to_sprint_id_dict = {}
+
+    for key, value in output_dict.items():
+        if key == 'Remaining':
+            for story_id in value:
+                id_to_sprint_id_dict[story_id] = None
+        else:
+            for story_id in value['Stories']:
+                id_to_sprint_id_dict[story_id] = int(key)
+
+    return id_to_sprint_id_dict
+
+
+# Return the path of the order file that goes with the given output file (eg. output.order.json for output.json)
+def get_order_file_path(output_file_path):
+    return os.path.splitext(output_file_path)[0] + ORDER_FILE_EXTENSION
+
+
+# Return the SHA-256 hash (as a hex string) of the contents of the given file
+def hash_file(file_path):
+
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+# Save the order file for a plan made from the given input file, given its stories in the order that they were slotted in (i.e. sorted, and normalized)
+def save_order_file(order_file_path, input_file_path, stories):
+
+    order_dict = {
+        'input_hash': hash_file(input_file_path),
+        'stories': [[story.id, story.importance, story.end_date] for story in stories]
+    }
+
+    with open(order_file_path, 'w') as order_file:
+        json.dump(order_dict, order_file)
+
+
+# Return the list of (story ID, normalized importance, normalized end date) of the stories in the given order file, in the order that they were slotted in, after making sure that it was made from the given input file
+def load_order_file(order_file_path, input_file_path):
+
+    if not os.path.exists(order_file_path):
+        raise ValueError('Order file {} not found: Make a full run of the input first, so that it can be re-planned incrementally!'.format(order_file_path))
+
+    with open(order_file_path) as order_file:
+        order_dict = json.load(order_file)
+
+    if order_dict['input_hash'] != hash_file(input_file_path):
+        raise ValueError('Order file {} was not made from input file {}: Make a full run of the input first, so that it can be re-planned incrementally!'.format(order_file_path, input_file_path))
+
+    return [(story_id, importance, end_date) for story_id, importance, end_date in order_dict['stories']]
+
+
+# Re-plan incrementally (see the top of this file).
+# If a PlanProfile is given, the counters for the re-normalized and re-slotted stories are added to it.
+# Returns the same as a full run (the sprints, the dictionary mapping sprint ID to sprint, and the list of stories that could not be slotted), as well as the number of stories that were put back into their previous sprints without being re-slotted, and the list of (story ID, previous sprint ID, new sprint ID) of all the stories that moved between sprints (where a sprint ID of None means that the story was not slotted).
+def replan(input_file_path, delta_file_path, previous_output_file_path, profile=None):
+
+    input_dict = lib.read_input_dict(input_file_path)
+
+    with open(delta_file_path) as delta_file:
+        delta_dict = json.load(delta_file)
+
+    with open(previous_output_file_path) as previous_output_file:
+        id_to_previous_sprint_id_dict = read_story_sprint_ids(json.load(previous_output_file))
+
+    # The order that the stories were slotted in for the previous plan, along with their normalized values
+    previous_order = load_order_file(get_order_file_path(previous_output_file_path), input_file_path)
+
+    sprints, id_to_sprint_dict = lib.load_sprint_data(input_dict)
+
+    # Dictionary mapping story ID to that story's normalized importance and end date in the previous plan
+    id_to_normalized_values_dict = {story_id: (importance, end_date) for story_id, importance, end_date in previous_order}
+
+    story_dicts = apply_delta(input_dict, delta_dict)['stories']
+    affected_story_ids = find_affected_story_ids(story_dicts, delta_dict)
+
+    # Only the affected stories need to be normalized from scratch -- every other story has exactly the same normalized values as before (so there's no need to parse its end date), and is still in the same order relative to the others
+    stories = []
+    id_to_story_dict = {}
+    affected_stories = []
+    for story_dict in story_dicts:
+
+        story_id = story_dict['id']
+        if story_id in affected_story_ids:
+            story = lib.create_story(story_dict)
+            affected_stories.append(story)
+        else:
+            importance, end_date = id_to_normalized_values_dict[story_id]
+            start_date = lib.convert_str_to_day(story_dict['start_date']) if 'start_date' in story_dict else lib.MIN_DATE
+            story = lib.Story(story_id, story_dict.get('name'), story_dict.get('size', 1), importance, start_date, end_date, story_dict.get('assignee'), story_dict.get('prerequisite_for'))
+            story.is_normalized = True
+
+        stories.append(story)
+        id_to_story_dict[story_id] = story
+
+    if len(id_to_story_dict) != len(stories):
+        raise ValueError('Stories cannot be re-planned incrementally (--delta) unless every story has a unique ID!')
+
+    lib.populate_children_from_ids(stories, id_to_story_dict)
+    lib.normalize_stories(affected_stories, profile=profile)
+
+    unaffected_stories = [id_to_story_dict[story_id] for story_id, importance, end_date in previous_order if story_id not in affected_story_ids]
+
+    sorted_stories = merge_affected_stories(stories, unaffected_stories, affected_stories)
+
+    # Slotting is greedy, so every story before the first one that differs from the previous plan's order (or that was affected by the delta) is guaranteed to end up in the same sprint as before
+    num_undisturbed_stories = 0
+    for (previous_story_id, importance, end_date), story in zip(previous_order, sorted_stories):
+        if (previous_story_id != story.id) or (story.id in affected_story_ids):
+            break
+        num_undisturbed_stories += 1
+
+    sprint_positions = {sprint.id: position for position, sprint in enumerate(sprints)}
+    previous_sprint_positions = []
+    for story in sorted_stories[:num_undisturbed_stories]:
+
+        if story.id not in id_to_previous_sprint_id_dict:
+            raise ValueError('Story {} is missing from the previous plan: The previous plan does not match the input!'.format(story.id))
+
+        previous_sprint_id = id_to_previous_sprint_id_dict[story.id]
+        if previous_sprint_id is None:
+            previous_sprint_positions.append(None)
+        elif previous_sprint_id in sprint_positions:
+            previous_sprint_positions.append(sprint_positions[previous_sprint_id])
+        else:
+            raise ValueError('Sprint {} is not in the input: The previous plan does not match the input!'.format(previous_sprint_id))
+
+    remaining_stories = lib.slot_stories(sorted_stories, sprints, previous_sprint_positions=previous_sprint_positions, profile=profile)
+
+    moved_stories = []
+    for story in sorted_stories:
+        if story.id in id_to_previous_sprint_id_dict:
+            previous_sprint_id = id_to_previous_sprint_id_dict[story.id]
+            if previous_sprint_id != story.assigned_sprint_id:
+                moved_stories.append((story.id, previous_sprint_id, story.assigned_sprint_id))
+
+    return (sprints, id_to_sprint_dict, remaining_stories, num_undisturbed_stories, moved_stories)
+
+
+# Given the stories (in the input's order), the unaffected ones among them in sorted order, and the affected ones (normalized, but in no particular order), return all of them in sorted order -- just like lib.sort_stories() would sort them.
+# The affected stories are usually few, so they're sorted on their own, and each one is binary searched into the unaffected ones.
+def merge_affected_stories(stories, unaffected_stories, affected_stories):
+
+    # lib.sort_stories() is a stable sort, so it is the same as sorting by its three keys followed by each story's position in the input
+    story_positions = {story.id: position for position, story in enumerate(stories)}
+    def sort_key(story):
+        return (-story.importance, story.end_date, -story.size, story_positions[story.id])
+
+    affected_stories = sorted(affected_stories, key=sort_key)
+
+    sorted_stories = []
+    first_position = 0
+    for story in affected_stories:
+
+        key = sort_key(story)
+        low = first_position
+        high = len(unaffected_stories)
+        while low < high:
+            middle = (low + high) // 2
+            if sort_key(unaffected_stories[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        sorted_stories.extend(unaffected_stories[first_position:low])
+        sorted_stories.append(story)
+        first_position = low
+
+    sorted_stories.extend(unaffected_stories[first_position:])
+    return sorted_stories
@@ -0,0 +1,489 @@
+#! /usr/bin/env python3
+
+__author__ = 'Pranav Marla'
+
+
+# Imports a backlog straight from a JIRA (or JIRA-compatible) REST API, instead of from an exported input file.
+#
+# Eg. Import the open issues of a project, and the active and future sprints of its board, and save them as an input file for main.py:
+#   JIRA_TOKEN=... ./jira_import.py --url https://example.atlassian.net --board 42 --jql 'project = ABC AND statusCategory != Done' --output backlog.json
+#
+# Issues become stories:
+#   id:                The issue's key (eg. ABC-123)
+#   name:              Its summary
+#   size:              Its story points (--story-points-field, default: DEFAULT_STORY_POINTS_FIELD) -- or the default size, if it has none
+#   importance:        Its priority (see PRIORITY_IMPORTANCES)
+#   start_date:        Its start date (--start-date-field, default: DEFAULT_START_DATE_FIELD), if it has one
+#   end_date:          Its due date, if it has one
+#   assignee:          The display name of its assignee, if it has one
+#   prerequisite_for:  The issues it blocks (i.e. its outward links of type PREREQUISITE_LINK_TYPE), that are also being imported
+#
+# Sprints become sprints, in the same order as the board lists them, with their capacities taken from the sprints' SPRINT_CAPACITY_PROPERTY (and SPRINT_ASSIGNEE_CAPACITIES_PROPERTY) properties, as set by eg. a capacity planning plugin.
+# Sprints without a capacity get --default-capacity (or, if there isn't one, are an error).
+# Sprints that haven't been given dates yet (eg. future sprints that haven't been scheduled) are skipped, with a warning.
+#
+# Requests are made concurrently (over a pool of keep-alive connections): every page of issues after the first is fetched at the same time, as soon as the first page says how many issues there are.
+# Requests are spaced out to stay under --max-rate per second, and requests turned away with 429 Too Many Requests (or 503 Service Unavailable) are retried after the time the server asks for.
+# Responses can be cached in a directory (--cache-dir), so that importing the same backlog again within --cache-max-age seconds doesn't have to ask the server at all.
+#
+# The server's credentials are read from the environment: JIRA_TOKEN (a personal access token) or, for basic auth, JIRA_USER and JIRA_TOKEN (an API token).
+#
+# NOTE: Only the standard library is used (the HTTP client is a minimal HTTP/1.1 client built on asyncio streams), so no extra packages need to be installed.
+#
+# For trying this out offline, see jira_stub.py.
+
+
+import argparse
+import asyncio
+import base64
+import cache
+import hashlib
+import json
+import lib
+import os
+import ssl
+import time
+from urllib.parse import urlencode, urlsplit
+
+
+SEARCH_PATH = '/rest/api/2/search'
+SPRINTS_PATH = '/rest/agile/1.0/board/{}/sprint'
+
+# JIRA Cloud's "Story point estimate" and "Start date" fields (other JIRA instances might use other custom fields)
+DEFAULT_STORY_POINTS_FIELD = 'customfield_10016'
+DEFAULT_START_DATE_FIELD = 'customfield_10015'
+
+# Issue link type meaning that the (inward) issue must be done before the (outward) issue
+PREREQUISITE_LINK_TYPE = 'Blocks'
+
+# Properties of sprint objects holding their capacities
+SPRINT_CAPACITY_PROPERTY = 'capacity'
+SPRINT_ASSIGNEE_CAPACITIES_PROPERTY = 'assigneeCapacities'
+
+# Dictionary mapping JIRA's default priorities to importances (any other priority gets an importance of 0)
+PRIORITY_IMPORTANCES = \
+    {
+        'Highest': 2,
+        'High': 1,
+        'Medium': 0,
+        'Low': -1,
+        'Lowest': -2
+    }
+
+# Number of issues to ask for per page (JIRA caps this at 100 anyway)
+ISSUES_PER_PAGE = 100
+
+# Max number of times to retry a request that was turned away because the server is busy
+MAX_RETRIES = 5
+
+# Seconds to wait before retrying a request that was turned away, when the server doesn't say how long to wait
+DEFAULT_RETRY_DELAY = 1
+
+# Bump this whenever the way responses are cached changes, so that older entries are never used
+RESPONSE_CACHE_FORMAT_VERSION = 1
+
+
+class JiraError(Exception):
+    pass
+
+
+# A pool of keep-alive HTTP/1.1 connections to a single server, that never has more than 'max_connections' of them open (and thus never has more than that many requests in flight)
+class ConnectionPool:
+
+    def __init__(self, base_url, max_connections=8):
+
+        url = urlsplit(base_url)
+        if url.scheme not in ('http', 'https'):
+            raise ValueError('URL {} must start with http:// or https://'.format(base_url))
+
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+        self.ssl_context = ssl.create_default_context() if url.scheme == 'https' else None
+        self.host_header = url.netloc.rpartition('@')[2]
+
+        # Path that every request's path is relative to (eg. for JIRA servers that aren't at the root of their site)
+        self.base_path = url.path.rstrip('/')
+
+        self.idle_connections = []
+        self.semaphore = asyncio.Semaphore(max_connections)
+
+    # Make a GET request for the given path (including any query string), and return the status, the (lower case) headers and the body of the response
+    async def get(self, path, headers):
+
+        async with self.semaphore:
+
+            # A connection that has been idle might have been closed by the server in the meantime, so a failed request on one of those is retried on a new connection
+            while self.idle_connections:
+                reader, writer = self.idle_connections.pop()
+                try:
+                    return await self.send_request(reader, writer, path, headers)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                except BaseException:
+                    writer.close()
+                    raise
+
+            reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+            try:
+                return await self.send_request(reader, writer, path, headers)
+            except BaseException:
+                writer.close()
+                raise
+
+    async def send_request(self, reader, writer, path, headers):
+
+        request_lines = ['GET {}{} HTTP/1.1'.format(self.base_path, path), 'Host: {}'.format(self.host_header)]
+        request_lines.extend('{}: {}'.format(name, value) for name, value in headers.items())
+        writer.write(('\r\n'.join(request_lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by {}'.format(self.host))
+        http_version, status = status_line.split()[:2]
+        status = int(status)
+
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self.read_chunked_body(reader)
+        elif 'content-length' in response_headers:
+            body = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            body = await reader.read()
+            response_headers['connection'] = 'close'
+
+        # Keep the connection for the next request, unless the server is closing it
+        if (response_headers.get('connection', '').lower() == 'close') or ((http_version == b'HTTP/1.0') and (response_headers.get('connection', '').lower() != 'keep-alive')):
+            writer.close()
+        else:
+            self.idle_connections.append((reader, writer))
+
+        return (status, response_headers, body)
+
+    @staticmethod
+    async def read_chunked_body(reader):
+
+        chunks = []
+        while True:
+            chunk_size = int((await reader.readline()).split(b';')[0], 16)
+            if chunk_size == 0:
+                break
+            chunks.append(await reader.readexactly(chunk_size))
+            await reader.readline()
+
+        # Skip any trailers
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+
+        return b''.join(chunks)
+
+    def close(self):
+
+        for reader, writer in self.idle_connections:
+            writer.close()
+        self.idle_connections = []
+
+
+# Spaces out requests so that no more than 'max_rate' of them start per second (no limit if 'max_rate' is 0)
+class RateLimiter:
+
+    def __init__(self, max_rate=0):
+        self.interval = 1 / max_rate if max_rate else 0
+        self.next_request_time = 0
+
+    async def wait(self):
+
+        if not self.interval:
+            return
+
+        # Reserve the next free slot before waiting, so that requests waiting at the same time get consecutive slots
+        now = time.monotonic()
+        request_time = max(now, self.next_request_time)
+        self.next_request_time = request_time + self.interval
+
+        if request_time > now:
+            await asyncio.sleep(request_time - now)
+
+
+# Directory of cached JSON responses, each in a file named after the hash of its URL, that are used for up to 'max_age' seconds after they were fetched
+class ResponseCache:
+
+    def __init__(self, cache_dir_path, max_age):
+
+        self.cache_dir_path = cache_dir_path
+        self.max_age = max_age
+        os.makedirs(cache_dir_path, exist_ok=True)
+
+    def get_file_path(self, url):
+        return os.path.join(self.cache_dir_path, hashlib.sha256('{}:{}'.format(RESPONSE_CACHE_FORMAT_VERSION, url).encode()).hexdigest() + '.response')
+
+    # Return the cached response for the given URL, or None if there isn't one (or it's too old)
+    def get(self, url):
+
+        file_path = self.get_file_path(url)
+        try:
+            if time.time() - os.path.getmtime(file_path) > self.max_age:
+                return None
+            entry_dict = cache.json_load_file(file_path)
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError):
+            cache.remove_file(file_path)
+            return None
+
+        # Guard against (astronomically unlikely) hash collisions
+        if entry_dict.get('url') != url:
+            return None
+
+        return entry_dict['response']
+
+    def put(self, url, response):
+        cache.save_json_file(self.get_file_path(url), {'url': url, 'response': response})
+
+
+class JiraClient:
+
+    def __init__(self, base_url, max_connections=8, max_rate=0, cache_dir_path='', cache_max_age=3600, user='', token=''):
+
+        self.base_url = base_url.rstrip('/')
+        self.connection_pool = ConnectionPool(base_url, max_connections)
+        self.rate_limiter = RateLimiter(max_rate)
+        self.response_cache = ResponseCache(cache_dir_path, cache_max_age) if cache_dir_path else None
+
+        self.headers = {'Accept': 'application/json'}
+        if user and token:
+            self.headers['Authorization'] = 'Basic ' + base64.b64encode('{}:{}'.format(user, token).encode()).decode('ascii')
+        elif token:
+            self.headers['Authorization'] = 'Bearer ' + token
+
+        self.num_requests = 0
+        self.num_cached_responses = 0
+
+    # Return the (JSON) response to a GET request for the given path and query parameters
+    async def get_json(self, path, params):
+
+        path = '{}?{}'.format(path, urlencode(params))
+        url = self.base_url + path
+
+        if self.response_cache is not None:
+            response = self.response_cache.get(url)
+            if response is not None:
+                self.num_cached_responses += 1
+                return response
+
+        for attempt in range(MAX_RETRIES + 1):
+
+            await self.rate_limiter.wait()
+            status, headers, body = await self.connection_pool.get(path, self.headers)
+            self.num_requests += 1
+
+            # The server is busy: wait as long as it asks (if it does), then try again
+            if (status in (429, 503)) and (attempt < MAX_RETRIES):
+                retry_after = headers.get('retry-after', '')
+                await asyncio.sleep(float(retry_after) if retry_after.isdigit() else DEFAULT_RETRY_DELAY * 2 ** attempt)
+                continue
+
+            if status != 200:
+                raise JiraError('GET {} returned {}: {}'.format(url, status, body[:500].decode('utf-8', 'replace')))
+
+            response = json.loads(body)
+            if self.response_cache is not None:
+                self.response_cache.put(url, response)
+            return response
+
+    # Return the list of issues found by the given JQL query, in the order the server returns them
+    async def fetch_issues(self, jql, fields):
+
+        params = {'jql': jql, 'fields': ','.join(fields), 'maxResults': ISSUES_PER_PAGE}
+
+        # The first page says how many issues there are (and how many the server actually returns per page), so all the other pages can then be fetched at once
+        first_page = await self.get_json(SEARCH_PATH, dict(params, startAt=0))
+        page_size = first_page.get('maxResults') or len(first_page['issues'])
+        if not page_size:
+            return first_page['issues']
+
+        params['maxResults'] = page_size
+        pages = await asyncio.gather(*(self.get_json(SEARCH_PATH, dict(params, startAt=start_at)) for start_at in range(page_size, first_page['total'], page_size)))
+
+        issues = list(first_page['issues'])
+        for page in pages:
+            issues.extend(page['issues'])
+
+        return issues
+
+    # Return the list of the given board's active and future sprints, in the order the server returns them.
+    # The sprints API doesn't say how many sprints there are, so pages are fetched one at a time (boards only ever have a handful of open sprints anyway).
+    async def fetch_sprints(self, board_id):
+
+        sprint_objects = []
+        while True:
+            page = await self.get_json(SPRINTS_PATH.format(board_id), {'state': 'active,future', 'startAt': len(sprint_objects)})
+            sprint_objects.extend(page['values'])
+            if page.get('isLast', True) or not page['values']:
+                return sprint_objects
+
+    def close(self):
+        self.connection_pool.close()
+
+
+# Given the lists of JIRA sprint and issue objects, return the input dictionary (in the regular input format) they describe
+def create_input_dict(sprint_objects, issue_objects, story_points_field=DEFAULT_STORY_POINTS_FIELD, start_date_field=DEFAULT_START_DATE_FIELD, default_capacity=None):
+
+    sprint_dicts = []
+    for sprint_object in sprint_objects:
+
+        # Future sprints don't necessarily have dates yet, and there's no way to plan stories into them without dates
+        if (sprint_object.get('startDate') is None) or (sprint_object.get('endDate') is None):
+            print('Warning: Skipping sprint {}, since it has no start date or end date yet'.format(sprint_object.get('name', sprint_object['id'])))
+            continue
+
+        capacity = sprint_object.get(SPRINT_CAPACITY_PROPERTY, default_capacity)
+        if capacity is None:
+            raise ValueError('Sprint {} has no capacity -- provide a default capacity!'.format(sprint_object.get('name', sprint_object['id'])))
+
+        # Dates are given as timestamps (eg. 2019-01-21T09:00:00.000Z), of which only the date is needed
+        sprint_dict = {'name': sprint_object['name'], 'start_date': sprint_object['startDate'][:10], 'end_date': sprint_object['endDate'][:10], 'capacity': capacity}
+        if SPRINT_ASSIGNEE_CAPACITIES_PROPERTY in sprint_object:
+            sprint_dict['assignee_capacities'] = sprint_object[SPRINT_ASSIGNEE_CAPACITIES_PROPERTY]
+
+        sprint_dicts.append(sprint_dict)
+
+    issue_keys = {issue_object['key'] for issue_object in issue_objects}
+
+    story_dicts = []
+    for issue_object in issue_objects:
+
+        fields = issue_object['fields']
+        story_dict = {'id': issue_object['key']}
+
+        if fields.get('summary') is not None:
+            story_dict['name'] = fields['summary']
+
+        # Story points come back as floating point numbers, even when they're whole numbers
+        story_points = fields.get(story_points_field)
+        if story_points is not None:
+            story_dict['size'] = int(story_points) if float(story_points).is_integer() else story_points
+
+        priority = fields.get('priority')
+        if priority is not None:
+            story_dict['importance'] = PRIORITY_IMPORTANCES.get(priority.get('name'), 0)
+
+        if fields.get(start_date_field):
+            story_dict['start_date'] = fields[start_date_field][:10]
+
+        if fields.get('duedate'):
+            story_dict['end_date'] = fields['duedate'][:10]
+
+        assignee = fields.get('assignee')
+        if assignee is not None:
+            story_dict['assignee'] = assignee['displayName']
+
+        # Links to issues that aren't being imported (eg. ones that are already done) are dropped
+        child_ids = [link_dict['outwardIssue']['key'] for link_dict in fields.get('issuelinks', ()) if (link_dict['type']['name'] == PREREQUISITE_LINK_TYPE) and ('outwardIssue' in link_dict) and (link_dict['outwardIssue']['key'] in issue_keys)]
+        if child_ids:
+            story_dict['prerequisite_for'] = child_ids
+
+        story_dicts.append(story_dict)
+
+    return {'sprints': sprint_dicts, 'stories': story_dicts}
+
+
+# Fetch the given board's sprints and the issues found by the given JQL query (concurrently), and return the input dictionary they describe
+async def fetch_input_dict(client, board_id, jql, story_points_field=DEFAULT_STORY_POINTS_FIELD, start_date_field=DEFAULT_START_DATE_FIELD, default_capacity=None):
+
+    fields = ['summary', story_points_field, start_date_field, 'duedate', 'priority', 'assignee', 'issuelinks']
+
+    try:
+        sprint_objects, issue_objects = await asyncio.gather(client.fetch_sprints(board_id), client.fetch_issues(jql, fields))
+    finally:
+        client.close()
+
+    return create_input_dict(sprint_objects, issue_objects, story_points_field, start_date_field, default_capacity)
+
+
+# Equivalent to lib.load_input_data(), but for a backlog fetched from a JIRA server with the given client (see fetch_input_dict() for the other arguments)
+def load_jira_input_data(client, board_id, jql, story_points_field=DEFAULT_STORY_POINTS_FIELD, start_date_field=DEFAULT_START_DATE_FIELD, default_capacity=None):
+
+    input_dict = asyncio.run(fetch_input_dict(client, board_id, jql, story_points_field, start_date_field, default_capacity))
+
+    sprints, id_to_sprint_dict = lib.load_sprint_data(input_dict)
+    stories, id_to_story_dict = lib.load_story_data(input_dict)
+
+    return (sprints, id_to_sprint_dict, stories, id_to_story_dict)
+
+
+def parse_command_line_args():
+
+    arg_parser = argparse.ArgumentParser(argument_default='')
+
+    arg_parser.add_argument('--url', help='Base URL of the JIRA server (eg. https://example.atlassian.net)')
+    arg_parser.add_argument('--board', help='ID of the board whose active and future sprints to import')
+    arg_parser.add_argument('--jql', default='statusCategory != Done', help="JQL query finding the issues to import (default: 'statusCategory != Done')")
+    arg_parser.add_argument('--story-points-field', default='customfield_10016', help='Field holding story points (default: customfield_10016)')
+    arg_parser.add_argument('--start-date-field', default='customfield_10015', help='Field holding start dates (default: customfield_10015)')
+    arg_parser.add_argument('--default-capacity', type=float, default=None, help='Capacity of sprints that have none set (default: none, i.e. every sprint must have one)')
+    arg_parser.add_argument('--connections', type=int, default=8, help='Max number of concurrent connections to the server (default: 8)')
+    arg_parser.add_argument('--max-rate', type=float, default=0, help='Max number of requests per second (default: 0, i.e. no limit)')
+    arg_parser.add_argument('--cache-dir', help='Directory to cache responses in')
+    arg_parser.add_argument('--cache-max-age', type=float, default=3600, help='Seconds for which cached responses are used (default: 3600)')
+    arg_parser.add_argument('--output', help='Input file to save the imported backlog to (default: input.json)')
+
+    args = arg_parser.parse_args()
+
+    if not args.url.strip():
+        raise ValueError('No JIRA URL provided!')
+    if not args.board.strip():
+        raise ValueError('No board ID provided!')
+    if args.connections <= 0:
+        raise ValueError('Number of connections must be positive!')
+
+    # Whole capacities stay whole numbers, just like in a regular input file
+    default_capacity = args.default_capacity
+    if (default_capacity is not None) and default_capacity.is_integer():
+        default_capacity = int(default_capacity)
+
+    # For safety, remove any extraneous whitespace
+    return \
+        (
+            args.url.strip(),
+            args.board.strip(),
+            args.jql.strip(),
+            args.story_points_field.strip(),
+            args.start_date_field.strip(),
+            default_capacity,
+            args.connections,
+            args.max_rate,
+            args.cache_dir.strip(),
+            args.cache_max_age,
+            args.output.strip() or 'input.json'
+        )
+
+
+def main():
+
+    base_url, board_id, jql, story_points_field, start_date_field, default_capacity, max_connections, max_rate, cache_dir_path, cache_max_age, output_file_path = parse_command_line_args()
+
+    client = JiraClient(base_url, max_connections, max_rate, cache_dir_path, cache_max_age, os.environ.get('JIRA_USER', ''), os.environ.get('JIRA_TOKEN', ''))
+
+    start_time = time.perf_counter()
+    input_dict = asyncio.run(fetch_input_dict(client, board_id, jql, story_points_field, start_date_field, default_capacity))
+
+    # Make sure the backlog is valid before saving it
+    lib.load_sprint_data(input_dict)
+    lib.load_story_data(input_dict)
+
+    print('Imported {} sprints and {} stories in {:.2f}s ({} requests, {} cached responses)'.format(len(input_dict['sprints']), len(input_dict['stories']), time.perf_counter() - start_time, client.num_requests, client.num_cached_responses))
+
+    with open(output_file_path, 'w') as output_file:
+        output_file.write(json.dumps(input_dict, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#! /usr/bin/env python3
+
+__author__ = 'Pranav Marla'
+
+
+# Local stub of the parts of a JIRA REST API that jira_import.py uses, serving a regular input file -- so that the importer can be tried out (and tested) offline.
+#
+# Eg. Serve an input file on localhost, and import it back again:
+#   ./jira_stub.py test-inputs/general1.json --port 8766
+#   ./jira_import.py --url http://127.0.0.1:8766 --board 1 --output imported.json
+#
+# Endpoints (both paginated with startAt and maxResults, just like JIRA):
+#   GET /rest/agile/1.0/board/<board ID>/sprint   The input's sprints, as future sprints (the board ID is ignored)
+#   GET /rest/api/2/search                        The input's stories, as issues, in the same order as the input (the JQL is ignored)
+#
+# Stories and sprints are mapped to JIRA fields exactly the way jira_import.py maps them back (see jira_import.py), so importing from the stub gives the same plan as the input file itself.
+# Importances outside of the range of priorities (-2 to 2) are clamped to it.
+#
+# To see how the importer copes with a slow or busy server, every request can be delayed (--latency), and requests beyond a given rate are turned away with 429 Too Many Requests (--max-rate).
+
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import jira_import
+import json
+import lib
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+
+# JIRA never returns more than this many results per page, however many are asked for
+MAX_RESULTS_PER_PAGE = 100
+
+# First JIRA ID given to the stub's sprints and issues
+FIRST_JIRA_ID = 10000
+
+SPRINTS_PATH_REGEX = re.compile(r'^/rest/agile/1\.0/board/\d+/sprint$')
+
+
+# Given an input dictionary (in the regular input format), return the list of JIRA sprint objects and the list of JIRA issue objects that jira_import.py would turn back into it
+def create_jira_objects(input_dict):
+
+    sprint_objects = []
+    for position, sprint_dict in enumerate(input_dict['sprints']):
+
+        sprint_object = \
+            {
+                'id': FIRST_JIRA_ID + position,
+                'name': sprint_dict.get('name', 'Sprint {}'.format(position + 1)),
+                'state': 'future',
+                'startDate': '{}T00:00:00.000Z'.format(sprint_dict['start_date']),
+                'endDate': '{}T00:00:00.000Z'.format(sprint_dict['end_date']),
+                jira_import.SPRINT_CAPACITY_PROPERTY: sprint_dict['capacity']
+            }
+
+        if 'assignee_capacities' in sprint_dict:
+            sprint_object[jira_import.SPRINT_ASSIGNEE_CAPACITIES_PROPERTY] = sprint_dict['assignee_capacities']
+
+        sprint_objects.append(sprint_object)
+
+    # Importances in between (or beyond) the priorities' importances get the closest priority
+    priority_names = {importance: priority_name for priority_name, importance in jira_import.PRIORITY_IMPORTANCES.items()}
+    min_importance = min(priority_names)
+    max_importance = max(priority_names)
+
+    # Issues link to both their prerequisites and the issues they are a prerequisite for, just like JIRA does
+    story_ids = [str(story_dict['id']) for story_dict in input_dict['stories']]
+    link_dicts = {story_id: [] for story_id in story_ids}
+    for story_id, story_dict in zip(story_ids, input_dict['stories']):
+        for child_id in story_dict.get('prerequisite_for', ()):
+            link_type = {'name': jira_import.PREREQUISITE_LINK_TYPE, 'inward': 'is blocked by', 'outward': 'blocks'}
+            link_dicts[story_id].append({'type': link_type, 'outwardIssue': {'key': str(child_id)}})
+            link_dicts[str(child_id)].append({'type': link_type, 'inwardIssue': {'key': story_id}})
+
+    issue_objects = []
+    for position, (story_id, story_dict) in enumerate(zip(story_ids, input_dict['stories'])):
+
+        fields = \
+            {
+                'summary': story_dict.get('name'),
+                jira_import.DEFAULT_STORY_POINTS_FIELD: story_dict.get('size'),
+                jira_import.DEFAULT_START_DATE_FIELD: story_dict.get('start_date'),
+                'duedate': story_dict.get('end_date'),
+                'priority': {'name': priority_names[min(max(round(story_dict.get('importance', 0)), min_importance), max_importance)]},
+                'assignee': {'displayName': story_dict['assignee']} if 'assignee' in story_dict else None,
+                'issuelinks': link_dicts[story_id]
+            }
+
+        issue_objects.append({'id': str(FIRST_JIRA_ID + position), 'key': story_id, 'fields': fields})
+
+    return (sprint_objects, issue_objects)
+
+
+class JiraStubRequestHandler(BaseHTTPRequestHandler):
+
+    # Keep connections open between requests, like a real JIRA server (every response has a Content-Length)
+    protocol_version = 'HTTP/1.1'
+
+    # Set by create_server()
+    sprint_objects = None
+    issue_objects = None
+    latency = 0
+    max_rate = 0
+
+    # Times of the requests handled in the last second (when there is a max rate)
+    recent_request_times = []
+    recent_request_times_lock = threading.Lock()
+
+    def do_GET(self):
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.max_rate and not self.allow_request():
+            self.send_json(429, {'errorMessages': ['Rate limit exceeded']}, {'Retry-After': '1'})
+            return
+
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+
+        if SPRINTS_PATH_REGEX.match(url.path):
+            start_at, values, is_last = self.get_page(self.sprint_objects, params)
+            self.send_json(200, {'maxResults': len(values), 'startAt': start_at, 'isLast': is_last, 'values': values})
+        elif url.path == jira_import.SEARCH_PATH:
+            start_at, issues, is_last = self.get_page(self.issue_objects, params)
+            self.send_json(200, {'maxResults': min(self.get_int_param(params, 'maxResults', MAX_RESULTS_PER_PAGE), MAX_RESULTS_PER_PAGE), 'startAt': start_at, 'total': len(self.issue_objects), 'issues': issues})
+        else:
+            self.send_json(404, {'errorMessages': ['Unknown path {}'.format(url.path)]})
+
+    # Return True if the request is within the max rate (and record it), otherwise False
+    def allow_request(self):
+
+        with self.recent_request_times_lock:
+
+            now = time.monotonic()
+            while self.recent_request_times and (self.recent_request_times[0] <= now - 1):
+                self.recent_request_times.pop(0)
+
+            if len(self.recent_request_times) >= self.max_rate:
+                return False
+
+            self.recent_request_times.append(now)
+            return True
+
+    @staticmethod
+    def get_int_param(params, name, default):
+        return int(params[name][0]) if name in params else default
+
+    # Return the start position, the items on the page requested by the given query parameters, and whether it is the last page
+    def get_page(self, items, params):
+
+        start_at = self.get_int_param(params, 'startAt', 0)
+        max_results = min(self.get_int_param(params, 'maxResults', MAX_RESULTS_PER_PAGE), MAX_RESULTS_PER_PAGE)
+        page_items = items[start_at:start_at + max_results]
+
+        return (start_at, page_items, start_at + max_results >= len(items))
+
+    def send_json(self, status, response_dict, headers=None):
+
+        body = json.dumps(response_dict, separators=(',', ':')).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Only log errors, rather than every request
+    def log_request(self, code='-', size='-'):
+        if isinstance(code, int) and (code >= 400) and (code != 429):
+            super().log_request(code, size)
+
+
+# Create (but don't start) a stub server for the given input dictionary, on the given host and port (0 picks a free port)
+def create_server(input_dict, host='127.0.0.1', port=0, latency=0, max_rate=0):
+
+    # A separate handler class per server, so that several stubs can run in the same process (eg. in tests)
+    sprint_objects, issue_objects = create_jira_objects(input_dict)
+    handler_class = type('JiraStubRequestHandler', (JiraStubRequestHandler,), {'sprint_objects': sprint_objects, 'issue_objects': issue_objects, 'latency': latency, 'max_rate': max_rate, 'recent_request_times': []})
+
+    return ThreadingHTTPServer((host, port), handler_class)
+
+
+def parse_command_line_args():
+
+    arg_parser = argparse.ArgumentParser(argument_default='')
+
+    arg_parser.add_argument('input', help='Input file to serve')
+    arg_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1, i.e. only this machine)')
+    arg_parser.add_argument('--port', type=int, default=8766, help='Port to listen on (default: 8766)')
+    arg_parser.add_argument('--latency', type=float, default=0, help='Seconds to delay every request by (default: 0)')
+    arg_parser.add_argument('--max-rate', type=int, default=0, help='Max number of requests per second, beyond which requests get 429 Too Many Requests (default: 0, i.e. no limit)')
+
+    args = arg_parser.parse_args()
+
+    # For safety, remove any extraneous whitespace
+    return \
+        (
+            args.input.strip(),
+            args.host.strip(),
+            args.port,
+            args.latency,
+            args.max_rate
+        )
+
+
+def main():
+
+    input_file_path, host, port, latency, max_rate = parse_command_line_args()
+
+    server = create_server(lib.read_input_dict(input_file_path), host, port, latency, max_rate)
+    print('Serving {} as a JIRA API on http://{}:{}'.format(input_file_path, host, server.server_address[1]))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,25 +2,45 @@ __author__ = 'Pranav Marla'
 
 
 import argparse
+from bisect import bisect_left
+from collections import Counter, OrderedDict
 from datetime import date, datetime
+import heapq
 import json
 from operator import attrgetter
+import time
+import tracemalloc
 
 
-# NOTE: date.resolution is the smallest possible difference between non-equal date objects (i.e. 1 day).
-ONE_DAY = date.resolution
+# Dates are stored and compared as day ordinals (i.e. date.toordinal(), where Jan 01, 0001 is day 1), rather than as date objects, since plain integers are much faster to compare and subtract.
+# They are only converted back to date objects (see convert_day_to_date()) when they're shown to the user.
+ONE_DAY = 1
 
 # Min possible date (Jan 01, 0001)
-MIN_DATE = date.min
+MIN_DATE = date.min.toordinal()
 
 # Max possible date (Dec 31, 9999)
-MAX_DATE = date.max
+MAX_DATE = date.max.toordinal()
 
 # We can convert a string representation of a date to the corresponding date object as long as the string adheres to this format.
 # This format can be thought of as 'YYYY-MM-DD'
 # Eg. '2019-08-23'
 DATE_STRING_FORMAT = '%Y-%m-%d'
 
+# Inputs tend to repeat the same few hundred dates over and over, so each distinct date string is only converted once (see convert_str_to_day()).
+# To keep memory bounded no matter what the inputs look like, the cache is cleared whenever it grows past this many entries.
+MAX_CACHED_DATE_STRINGS = 100000
+
+# Input files with any of these extensions are assumed to be in the streaming NDJSON format (see load_ndjson_input_data())
+NDJSON_FILE_EXTENSIONS = ('.ndjson', '.jsonl')
+
+# Capacity value used by SprintIndex for positions that must never be picked (i.e. padding positions, and sprints that slot_stories() has given up on).
+# Every real capacity (even a negative one) is bigger than this, and no story size is small enough to fit into it.
+UNAVAILABLE_CAPACITY = float('-inf')
+
+# Assignee capacity value used by SprintIndex for sprints that don't limit an assignee's capacity at all
+UNLIMITED_CAPACITY = float('inf')
+
 
 # This generator function returns a generator iterator. Every time the generator iterator is iterated upon, it returns the next consecutive number.
 def consecutive_number_generator_function():
@@ -36,9 +56,12 @@ class Sprint:
 
     SPRINT_ID_GENERATOR = consecutive_number_generator_function()
 
-    def __init__(self, start_date, end_date, total_capacity, assignee_total_capacities=None, name=None):
+    # If no ID is given, the next number from the (process-wide) SPRINT_ID_GENERATOR is used
+    def __init__(self, start_date, end_date, total_capacity, assignee_total_capacities=None, name=None, id=None):
         
-        self.id = next(self.SPRINT_ID_GENERATOR)
+        if id is None:
+            id = next(self.SPRINT_ID_GENERATOR)
+        self.id = id
         self.name = name
         self.start_date = start_date
         self.end_date = end_date
@@ -59,8 +82,14 @@ class Sprint:
         
         self.stories = []
 
+    # Undo any slotting, so that the sprint is exactly as it was when it was created
+    def reset(self):
+        self.available_capacity = self.total_capacity
+        self.assignee_available_capacities = self.assignee_total_capacities.copy()
+        self.stories = []
+
     def __repr__(self):
-        return 'Sprint(id={}, name={}, start_date={}, end_date={}, total_capacity={}, available_capacity={}, assignee_total_capacities={}, assignee_available_capacities={}, stories={})'.format(self.id, self.name, self.start_date, self.end_date, self.total_capacity, self.available_capacity, self.assignee_total_capacities, self.assignee_available_capacities, self.stories)
+        return 'Sprint(id={}, name={}, start_date={}, end_date={}, total_capacity={}, available_capacity={}, assignee_total_capacities={}, assignee_available_capacities={}, stories={})'.format(self.id, self.name, convert_day_to_date(self.start_date), convert_day_to_date(self.end_date), self.total_capacity, self.available_capacity, self.assignee_total_capacities, self.assignee_available_capacities, self.stories)
 
 
 class Story:
@@ -112,8 +141,12 @@ class Story:
         # The ID of the sprint that this story has been slotted into
         self.assigned_sprint_id = None
 
+        # Position (in the sorted list of sprints being slotted into) of the earliest sprint that this story may be slotted into, given the sprints its parents were slotted into.
+        # Set by slot_stories().
+        self.earliest_sprint_position = 0
+
     def __repr__(self):
-        return 'Story(id={}, name={}, size={}, importance={}, start_date={}, end_date={}, assignee={}, children_ids={}, children={}, is_normalized={}, assigned_sprint_id={})'.format(self.id, self.name, self.size, self.importance, self.start_date, self.end_date, self.assignee, self.children_ids, self.children, self.is_normalized, self.assigned_sprint_id)
+        return 'Story(id={}, name={}, size={}, importance={}, start_date={}, end_date={}, assignee={}, children_ids={}, children={}, is_normalized={}, assigned_sprint_id={})'.format(self.id, self.name, self.size, self.importance, convert_day_to_date(self.start_date), convert_day_to_date(self.end_date), self.assignee, self.children_ids, self.children, self.is_normalized, self.assigned_sprint_id)
     
     def __str__(self):
         
@@ -133,6 +166,321 @@ class Story:
         return'\t'.join(story_description_components)
 
 
+# Index over a list of sprints (sorted by end date, as done by load_sprint_data()) which, given a story, finds the first sprint that has enough available capacity for it and abides by its start and end date constraints, without having to check every sprint one at a time.
+#
+# The sprints' end dates are sorted, so we can binary search for the first sprint that ends on or after the story's start date.
+# From there, we use a segment tree: each node stores the max available capacity and the min start date of all the sprints below it, so we can skip over entire ranges of sprints that are either too full, or start too late, for the story.
+class SprintIndex:
+
+    def __init__(self, sprints, max_date=MAX_DATE):
+
+        self.sprints = sprints
+        self.sprint_end_dates = [sprint.end_date for sprint in sprints]
+
+        # The segment tree is stored as a flat list, where node i's children are nodes 2i and 2i+1, and the leaves (one per sprint, plus padding) start at 'self.first_leaf'
+        first_leaf = 1
+        while first_leaf < len(sprints):
+            first_leaf *= 2
+        self.first_leaf = first_leaf
+
+        self.max_capacities = [UNAVAILABLE_CAPACITY] * (2 * first_leaf)
+        self.min_start_dates = [max_date] * (2 * first_leaf)
+
+        for position, sprint in enumerate(sprints):
+            self.max_capacities[first_leaf + position] = sprint.available_capacity
+            self.min_start_dates[first_leaf + position] = sprint.start_date
+
+        for node in range(first_leaf - 1, 0, -1):
+            self.max_capacities[node] = max(self.max_capacities[2 * node], self.max_capacities[2 * node + 1])
+            self.min_start_dates[node] = min(self.min_start_dates[2 * node], self.min_start_dates[2 * node + 1])
+
+        # children_first_positions[i] is the position of the first sprint that ends on or after sprints[i] starts -- i.e. the earliest sprint that the children of a story slotted into sprints[i] may be slotted into.
+        # The last entry is for the children of stories that could not be slotted at all, which may only go into sprints that end on 'max_date'.
+        self.children_first_positions = [bisect_left(self.sprint_end_dates, sprint.start_date) for sprint in sprints] + [bisect_left(self.sprint_end_dates, max_date)]
+
+        # Number of sprints that slot_stories() has not yet given up on
+        self.num_available_sprints = len(sprints)
+
+        # Heap containing the positions of the available sprints that have no available capacity left
+        self.full_sprint_positions = [position for position, sprint in enumerate(sprints) if sprint.available_capacity == 0]
+        heapq.heapify(self.full_sprint_positions)
+
+        # Every assignee that has a capacity in at least one sprint
+        self.assignees = set()
+        for sprint in sprints:
+            self.assignees.update(sprint.assignee_available_capacities)
+
+        # Dictionary mapping assignee to a segment tree (laid out just like 'self.max_capacities') of the max available capacity of that assignee in the sprints below each node.
+        # Sprints that don't limit the assignee's capacity count as having infinite capacity for them.
+        # Each assignee's tree is only built the first time a story assigned to them is slotted.
+        self.assignee_max_capacities = {}
+
+        # Number of times a sprint with enough available capacity for a story had to be skipped because of the story's assignee's available capacity in it
+        self.num_assignee_capacity_rejections = 0
+
+        # While True, changes to the sprints' capacities only update the leaves of the segment trees (see finish_replay())
+        self.is_replaying = False
+
+    # Return the position (in the sprints list) of the first sprint, at or after 'first_position', that has at least 'story_size' available capacity (and, if an assignee is given, at least 'story_size' available capacity for that assignee) and whose dates overlap with the given start and end dates.
+    # If there is no such sprint, return None.
+    def find_first_sprint(self, story_size, story_start_date, story_end_date, first_position=0, assignee=None):
+
+        # Sprints that end before the story's start date can never be used for it
+        first_position = max(first_position, bisect_left(self.sprint_end_dates, story_start_date))
+        if first_position >= len(self.sprints):
+            return None
+
+        position = self._find_first_leaf(self.max_capacities, 1, 0, self.first_leaf, first_position, story_size, story_end_date)
+        if (position is None) or (assignee not in self.assignees):
+            return position
+
+        # Leapfrog between the two trees: each one skips straight past the sprints that the other one's candidate doesn't have enough capacity in, until both agree on a sprint
+        assignee_max_capacities = self._get_assignee_max_capacities(assignee)
+        while assignee_max_capacities[self.first_leaf + position] < story_size:
+
+            self.num_assignee_capacity_rejections += 1
+
+            position = self._find_first_leaf(assignee_max_capacities, 1, 0, self.first_leaf, position + 1, story_size, story_end_date)
+            if position is None:
+                return None
+
+            position = self._find_first_leaf(self.max_capacities, 1, 0, self.first_leaf, position, story_size, story_end_date)
+            if position is None:
+                return None
+
+        return position
+
+    # Recursive helper function for find_first_sprint(), which searches the given segment tree of max capacities
+    # Node 'node' covers the positions in the range [node_start, node_end)
+    def _find_first_leaf(self, max_capacities, node, node_start, node_end, first_position, story_size, story_end_date):
+
+        # Skip this entire range if it is before the first position we care about, if none of its sprints has enough capacity for the story, or if all of its sprints start after the story's end date
+        if (node_end <= first_position) \
+            or (max_capacities[node] < story_size) \
+            or (self.min_start_dates[node] > story_end_date):
+            return None
+
+        if node >= self.first_leaf:
+            return node_start
+
+        node_middle = (node_start + node_end) // 2
+        position = self._find_first_leaf(max_capacities, 2 * node, node_start, node_middle, first_position, story_size, story_end_date)
+        if position is None:
+            position = self._find_first_leaf(max_capacities, 2 * node + 1, node_middle, node_end, first_position, story_size, story_end_date)
+
+        return position
+
+    # Return the segment tree of max available capacities for the given assignee, building it if necessary
+    def _get_assignee_max_capacities(self, assignee):
+
+        assignee_max_capacities = self.assignee_max_capacities.get(assignee)
+        if assignee_max_capacities is not None:
+            return assignee_max_capacities
+
+        first_leaf = self.first_leaf
+        assignee_max_capacities = [UNAVAILABLE_CAPACITY] * (2 * first_leaf)
+
+        for position, sprint in enumerate(self.sprints):
+            assignee_max_capacities[first_leaf + position] = sprint.assignee_available_capacities.get(assignee, UNLIMITED_CAPACITY)
+
+        for node in range(first_leaf - 1, 0, -1):
+            assignee_max_capacities[node] = max(assignee_max_capacities[2 * node], assignee_max_capacities[2 * node + 1])
+
+        self.assignee_max_capacities[assignee] = assignee_max_capacities
+        return assignee_max_capacities
+
+    # Putting stories back into their previous sprints (see replay_slot_story()) only ever reads the leaves of the segment trees, so, while replaying, the rest of each tree is left alone until this rebuilds it (once) before the next search
+    def finish_replay(self):
+
+        self.is_replaying = False
+
+        for max_capacities in [self.max_capacities] + list(self.assignee_max_capacities.values()):
+            for node in range(self.first_leaf - 1, 0, -1):
+                max_capacities[node] = max(max_capacities[2 * node], max_capacities[2 * node + 1])
+
+    # Returns False if slot_stories() has given up on the sprint at the given position
+    def is_sprint_available(self, position):
+        return self.max_capacities[self.first_leaf + position] != UNAVAILABLE_CAPACITY
+
+    # Call this whenever the available capacity of the sprint at the given position changes (along with the assignee whose available capacity in it changed, if any)
+    def update_sprint(self, position, assignee=None):
+
+        sprint = self.sprints[position]
+        self._set_leaf_capacity(self.max_capacities, position, sprint.available_capacity)
+
+        if sprint.available_capacity == 0:
+            heapq.heappush(self.full_sprint_positions, position)
+
+        # If the assignee's tree hasn't been built yet, it will pick up the new capacity whenever it is built
+        if (assignee in self.assignee_max_capacities) and (assignee in sprint.assignee_available_capacities):
+            self._set_leaf_capacity(self.assignee_max_capacities[assignee], position, sprint.assignee_available_capacities[assignee])
+
+    # Return the positions of the full sprints before 'end_position' that a search for the given story skipped past because of the assignee's available capacity in them (rather than because they were full), for remove_full_sprints_before().
+    # A full sprint can only be skipped because of its assignee capacity if the story has a size of 0 (otherwise it would have been skipped for being full), so only then do we need to work out which ones those are.
+    def find_assignee_skipped_full_sprints(self, end_position, story_size, story_start_date, story_end_date, assignee, first_position=0):
+
+        assignee_skipped_positions = []
+        if (story_size == 0) and (assignee is not None):
+            for position in self.full_sprint_positions:
+                sprint = self.sprints[position]
+                if (first_position <= position < end_position) \
+                    and (sprint.end_date >= story_start_date) \
+                    and (sprint.start_date <= story_end_date) \
+                    and (sprint.assignee_available_capacities.get(assignee, story_size) < story_size):
+                    assignee_skipped_positions.append(position)
+
+        return assignee_skipped_positions
+
+    # To preserve the behaviour of the original linear scan in slot_stories(), a full sprint is only given up on (i.e. even stories of size 0 can no longer be slotted into it) once a story has been checked against it and skipped past it.
+    # Thus, after slotting a story, call this with the position that the search for that story ended at, as well as the positions that were skipped because of their assignee capacity (these were not skipped for being full, so they are not given up on).
+    def remove_full_sprints_before(self, end_position, assignee_skipped_positions=()):
+
+        # Full sprints that were skipped because of their assignee capacity, which we need to add back to the heap after we're done
+        kept_positions = []
+
+        full_sprint_positions = self.full_sprint_positions
+        while full_sprint_positions and full_sprint_positions[0] < end_position:
+            position = heapq.heappop(full_sprint_positions)
+            if position in assignee_skipped_positions:
+                kept_positions.append(position)
+            # A sprint's capacity can only ever go down, so a full sprint stays full -- but it could have been pushed onto the heap twice
+            elif self.is_sprint_available(position):
+                self._set_leaf_capacity(self.max_capacities, position, UNAVAILABLE_CAPACITY)
+                self.num_available_sprints -= 1
+
+        for position in kept_positions:
+            heapq.heappush(full_sprint_positions, position)
+
+    def _set_leaf_capacity(self, max_capacities, position, capacity):
+
+        node = self.first_leaf + position
+        max_capacities[node] = capacity
+        if self.is_replaying:
+            return
+
+        node //= 2
+        while node:
+            max_capacities[node] = max(max_capacities[2 * node], max_capacities[2 * node + 1])
+            node //= 2
+
+
+# Records how long each phase of planning takes (along with the peak memory used during it), as well as counters of how much work was done in the hot paths, so that slow plans can be diagnosed.
+# Pass one to the functions that accept a 'profile' argument to collect their counters:
+#   stories_normalized, dependency_links_followed: from normalize_stories()
+#   stories_searched, sprints_probed, max_sprints_probed_per_story, assignee_capacity_rejections: from slot_story()
+#   stories_slotted, stories_not_slotted, previous_placements_replayed, child_sprint_position_adjustments: from slot_stories()
+# NOTE: Peak memory is measured with tracemalloc, which slows everything down while profiling -- so compare phase times against each other, rather than against unprofiled runs.
+class PlanProfile:
+
+    def __init__(self):
+
+        # Dictionary mapping each phase's name to a dictionary containing how long it took (in seconds) and the peak memory traced during it (in bytes), in the order the phases ran
+        self.phases = OrderedDict()
+
+        self.counters = Counter()
+
+        self._phase_name = None
+        self._phase_start_time = None
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # Start timing a new phase (which ends the previous phase, if any)
+    def start_phase(self, phase_name):
+
+        self.end_phase()
+
+        tracemalloc.reset_peak()
+        self._phase_name = phase_name
+        self._phase_start_time = time.perf_counter()
+
+    def end_phase(self):
+
+        if self._phase_name is None:
+            return
+
+        phase_duration = time.perf_counter() - self._phase_start_time
+        phase_peak_memory = tracemalloc.get_traced_memory()[1]
+
+        self.phases[self._phase_name] = OrderedDict([('seconds', phase_duration), ('peak_memory_bytes', phase_peak_memory)])
+        self._phase_name = None
+
+    def count(self, counter_name, amount=1):
+        self.counters[counter_name] += amount
+
+    # Set the counter to the given value, if it's bigger than the counter's current value
+    def count_max(self, counter_name, value):
+        if value > self.counters[counter_name]:
+            self.counters[counter_name] = value
+
+    # Return a JSON-serializable dictionary containing everything recorded so far (ending the current phase, if any)
+    def to_dict(self):
+
+        self.end_phase()
+
+        counters = OrderedDict(sorted(self.counters.items()))
+        if counters.get('stories_searched'):
+            counters['mean_sprints_probed_per_story'] = counters['sprints_probed'] / counters['stories_searched']
+
+        return OrderedDict([('phases', self.phases), ('counters', counters)])
+
+
+# Plans any number of sets of sprints for the same stories, within the same process.
+# The stories are normalized and sorted once, up front, and each call to plan() starts from that same state, so the results never depend on what was planned before.
+class Planner:
+
+    def __init__(self, stories, id_to_story_dict):
+
+        populate_children_from_ids(stories, id_to_story_dict)
+        normalize_stories(stories)
+        sort_stories(stories)
+        self.stories = stories
+
+    # Slot the stories into the given sprints (see slot_stories()), and return the list of stories that could not be slotted into any sprint.
+    # NOTE: The stories' sprint assignments are only valid until the next call to plan().
+    def plan(self, sprints):
+
+        for story in self.stories:
+            story.assigned_sprint_id = None
+
+        return slot_stories(self.stories, sprints)
+
+    # Slot the stories into the first 'num_sprints' given sprints only (see HorizonPlan), and return the HorizonPlan, so that more sprints can be resolved later on.
+    # NOTE: The stories' sprint assignments are only valid until the next call to plan() or plan_horizon().
+    def plan_horizon(self, sprints, num_sprints):
+
+        for story in self.stories:
+            story.assigned_sprint_id = None
+
+        horizon_plan = HorizonPlan(self.stories, sprints)
+        horizon_plan.resolve(num_sprints)
+
+        return horizon_plan
+
+
+# Create a compact, consistent representation of the results of a plan (as saved to the output JSON file), for easy comparison.
+# Ensure that, given the same input, the same output is consistently generated!
+def create_output_dict(sprints, remaining_stories):
+    return OrderedDict(iterate_output_items(sprints, remaining_stories))
+
+
+# Yield the (key, value) pairs of the dictionary returned by create_output_dict(), in order, one sprint at a time -- so that the results can be written out without holding all of them in memory at once.
+def iterate_output_items(sprints, remaining_stories):
+
+    for sprint in sprints:
+
+        sprint_dict = OrderedDict()
+        sprint_dict['Stories'] = [story.id for story in sprint.stories]
+
+        sprint_assignees_dict = sprint_dict['Assignee Workload'] = OrderedDict()
+        for assignee, assignee_remaining_capacity in sprint.assignee_available_capacities.items():
+            sprint_assignees_dict[assignee] = sprint.assignee_total_capacities[assignee] - assignee_remaining_capacity
+
+        yield (sprint.id, sprint_dict)
+
+    yield ('Remaining', [story.id for story in remaining_stories])
+
+
 def parse_command_line_args():
 
     # Note: If any of the arguments are not supplied, their value with either be None or whatever alternate default value we specify below.
@@ -141,13 +489,35 @@ def parse_command_line_args():
     
     # For ease of maintenance, make all arguments optional
     arg_parser.add_argument('--input')
+    arg_parser.add_argument('--columnar', action='store_true', help='Use the (NumPy) array-backed story store, for inputs with millions of stories')
+    arg_parser.add_argument('--delta', help='Re-plan incrementally: file containing the stories that were changed, added (and removed) since the previous plan was made from the input file')
+    arg_parser.add_argument('--previous-output', help='Output file of the previous plan, for use with --delta (default: output.json)')
+    arg_parser.add_argument('--profile', action='store_true', help='Save the time and peak memory of each phase, and hot path counters, to profile.json')
+    arg_parser.add_argument('--optimize', type=float, default=0, help='Spend up to this many seconds searching for a plan that slots more story points than the greedy plan (default: 0, i.e. just use the greedy plan)')
+    arg_parser.add_argument('--quiet', action='store_true', help="Don't print every sprint's stories -- just a summary")
+    arg_parser.add_argument('--output-format', default='json', choices=('json', 'compact-json', 'ndjson', 'csv'), help='Format of the output file (default: json)')
+    arg_parser.add_argument('--output', help='Output file (default: output.json, or output.ndjson/output.csv for those formats)')
+    arg_parser.add_argument('--cache-dir', help='Directory to cache preprocessed (normalized and sorted) stories in, so that re-planning an unchanged input skips straight to slotting')
+    arg_parser.add_argument('--cache-max-mb', type=float, default=1024, help='Max size of the cache directory, in megabytes (default: 1024) -- the least recently used entries are deleted to stay under it')
+    arg_parser.add_argument('--horizon', type=int, default=0, help='Only plan this many sprints from the start (plus any later sprints that overlap the last of them), which are planned exactly as they would be in a full plan (default: 0, i.e. plan every sprint)')
 
     args = arg_parser.parse_args()
 
     # For safety, remove any extraneous whitespace
     return \
         (
-            args.input.strip()
+            args.input.strip(),
+            bool(args.columnar),
+            args.delta.strip(),
+            args.previous_output.strip(),
+            bool(args.profile),
+            args.optimize,
+            bool(args.quiet),
+            args.output_format,
+            args.output.strip(),
+            args.cache_dir.strip(),
+            int(args.cache_max_mb * 1024 * 1024),
+            args.horizon
         )
 
 # input_file_path is a string containing the file path of the input file
@@ -175,14 +545,18 @@ def load_sprint_data(input_dict):
 
     sprint_dicts_list = input_dict['sprints']
 
+    # Number each input's sprints starting from 1 (in the order they appear in the input), regardless of how many other inputs have been loaded by this process
+    sprint_id_generator = consecutive_number_generator_function()
+
     for sprint_dict in sprint_dicts_list:
 
         # Dictionary containing the arguments to be provided when creating a new Sprint object.
         # Initialize it with the mandatory arguments.
         sprint_constructor_args_dict = \
             {
-                'start_date': convert_str_to_date(sprint_dict['start_date']), 
-                'end_date': convert_str_to_date(sprint_dict['end_date']), 'total_capacity': sprint_dict['capacity']
+                'start_date': convert_str_to_day(sprint_dict['start_date']), 
+                'end_date': convert_str_to_day(sprint_dict['end_date']), 'total_capacity': sprint_dict['capacity'],
+                'id': next(sprint_id_generator)
             }
 
         # If the optional arguments are present, add them as well
@@ -206,10 +580,45 @@ def load_sprint_data(input_dict):
 
 # Given a string representation of a date, return the corresponding date object
 def convert_str_to_date(date_string, date_string_format=DATE_STRING_FORMAT):
+
+    # strptime() is very slow, so parse the usual zero-padded 'YYYY-MM-DD' strings directly.
+    # Anything else (eg. '2019-8-23') is left to strptime(), so that exactly the same strings are accepted as before.
+    if (date_string_format == DATE_STRING_FORMAT) \
+        and (len(date_string) == 10) \
+        and (date_string[4] == '-') \
+        and (date_string[7] == '-') \
+        and date_string.isascii() \
+        and date_string[:4].isdigit() \
+        and date_string[5:7].isdigit() \
+        and date_string[8:].isdigit():
+        return date(int(date_string[:4]), int(date_string[5:7]), int(date_string[8:]))
+
     # Eg. Given a date string of '2019-08-23', and a date string format of '%Y-%m-%d', this function will return the corresponding date object: datetime.date(2019, 8, 23).
     return(datetime.strptime(date_string, date_string_format).date())
 
 
+# Dictionary mapping each date string converted by convert_str_to_day() to its day ordinal
+DATE_STRING_TO_DAY_DICT = {}
+
+# Given a string representation of a date, return the corresponding day ordinal (see ONE_DAY)
+def convert_str_to_day(date_string):
+
+    day = DATE_STRING_TO_DAY_DICT.get(date_string)
+    if day is None:
+
+        if len(DATE_STRING_TO_DAY_DICT) >= MAX_CACHED_DATE_STRINGS:
+            DATE_STRING_TO_DAY_DICT.clear()
+
+        day = DATE_STRING_TO_DAY_DICT[date_string] = convert_str_to_date(date_string).toordinal()
+
+    return day
+
+
+# Given a day ordinal, return the corresponding date object
+def convert_day_to_date(day):
+    return date.fromordinal(day)
+
+
 def load_story_data(input_dict, default_end_date=MAX_DATE):
 
     stories = []
@@ -219,40 +628,96 @@ def load_story_data(input_dict, default_end_date=MAX_DATE):
     id_to_story_dict = {}
 
     for story_dict in story_dicts_list:
+        story = create_story(story_dict)
+        stories.append(story)
+        id_to_story_dict[story.id] = story
 
-        # Dictionary containing the arguments to be provided when creating a new Story object.
-        # Initialize it with the mandatory arguments.
-        story_constructor_args_dict = {'id': story_dict['id']}
+    return (stories, id_to_story_dict)
 
-        # If the optional arguments are present, add them as well
 
-        if 'name' in story_dict:
-            story_constructor_args_dict['name'] = story_dict['name']
-        
-        if 'size' in story_dict:
-            story_constructor_args_dict['size'] = story_dict['size']
-        
-        if 'importance' in story_dict:
-            story_constructor_args_dict['importance'] = story_dict['importance']
-        
-        if 'start_date' in story_dict:
-            story_constructor_args_dict['start_date'] = convert_str_to_date(story_dict['start_date'])
+# Given a dictionary describing a story (as found in the input file), return the corresponding Story object.
+# Any optional arguments that are not present in the dictionary get the same default values as in the Story constructor.
+def create_story(story_dict, min_date=MIN_DATE, max_date=MAX_DATE):
 
-        if 'end_date' in story_dict:
-            story_constructor_args_dict['end_date'] = convert_str_to_date(story_dict['end_date'])
-        
-        if 'assignee' in story_dict:
-            story_constructor_args_dict['assignee'] = story_dict['assignee']
-        
-        if 'prerequisite_for' in story_dict:
-            story_constructor_args_dict['children_ids'] = story_dict['prerequisite_for']
+    if 'start_date' in story_dict:
+        start_date = convert_str_to_day(story_dict['start_date'])
+    else:
+        start_date = min_date
 
-        # Now that we've assembled all the arguments, use them to create a new Story object and add it to the list of Story objects
-        story = Story(**story_constructor_args_dict)
-        stories.append(story)
-        id_to_story_dict[story.id] = story
+    if 'end_date' in story_dict:
+        end_date = convert_str_to_day(story_dict['end_date'])
+    else:
+        end_date = max_date
+
+    return Story(story_dict['id'], story_dict.get('name'), story_dict.get('size', 1), story_dict.get('importance', 0), start_date, end_date, story_dict.get('assignee'), story_dict.get('prerequisite_for'))
+
+
+# Returns True if the given input file is in the streaming NDJSON (newline-delimited JSON) format rather than the regular JSON format
+def is_ndjson_file(input_file_path):
+    return input_file_path.endswith(NDJSON_FILE_EXTENSIONS)
+
+
+# Like load_input_data(), but for huge inputs in the streaming NDJSON format: stories are read in and turned into Story objects one line at a time, so the file's contents never have to be held in memory all at once.
+# The first (non-blank) line must be a JSON object containing the 'sprints' list (i.e. the same as in the regular JSON format), and every line after that must be a JSON object describing a single story.
+# Eg.
+#   {"sprints": [{"start_date": "2019-01-21", "end_date": "2019-01-24", "capacity": 15}]}
+#   {"id": "A", "size": 5, "prerequisite_for": ["B"]}
+#   {"id": "B", "size": 3}
+def load_ndjson_input_data(input_file_path):
+
+    # No input file path argument was provided, or a blank string was provided
+    if not input_file_path:
+        raise ValueError('No input file path provided!')
+
+    stories = []
+
+    # Dictionary mapping story ID (a string) to the corresponding Story object
+    id_to_story_dict = {}
+
+    with open(input_file_path) as input_file:
+
+        lines = (line for line in input_file if not line.isspace())
+
+        header_line = next(lines, None)
+        if header_line is None:
+            raise ValueError('Input file {} is empty!'.format(input_file_path))
+        sprints, id_to_sprint_dict = load_sprint_data(json.loads(header_line))
+
+        for story in stream_stories(lines):
+            stories.append(story)
+            id_to_story_dict[story.id] = story
+
+    return (sprints, id_to_sprint_dict, stories, id_to_story_dict)
+
+
+# Read the given input file (in either the regular JSON format or the streaming NDJSON format) into a single dictionary, in the regular JSON format.
+# Use this when the raw descriptions of the sprints and stories are needed, rather than Sprint and Story objects.
+def read_input_dict(input_file_path):
+
+    # No input file path argument was provided, or a blank string was provided
+    if not input_file_path:
+        raise ValueError('No input file path provided!')
+
+    with open(input_file_path) as input_file:
+
+        if not is_ndjson_file(input_file_path):
+            return json.load(input_file)
+
+        lines = (line for line in input_file if not line.isspace())
+
+        header_line = next(lines, None)
+        if header_line is None:
+            raise ValueError('Input file {} is empty!'.format(input_file_path))
+        input_dict = json.loads(header_line)
+        input_dict['stories'] = [json.loads(line) for line in lines]
+
+    return input_dict
 
-    return (stories, id_to_story_dict)
+
+# This generator function takes an iterable of lines, each containing the JSON description of a single story, and yields the corresponding Story objects one at a time.
+def stream_stories(lines):
+    for line in lines:
+        yield create_story(json.loads(line))
 
 
 # At this point, each story has a list of the (string) IDs of its children, but its list of the actual children themselves is empty -- populate the latter list with the children whose IDs are the corresponding elements in the former list.
@@ -268,66 +733,107 @@ def populate_children_from_ids(stories, id_to_story_dict):
 #    NOTE: We make sure that A's end_date is at least 1 day before the earliest end_date of all the stories that depend on A to ensure that A is slotted out before the stories that depend on A (note that they can still end up in the same sprint together, but B/C should never end up in an EARLIER sprint than A)!
 #
 # If a story's importance and end_date adhere to the above rules regarding the corresponding values of its children, then we say that that story is 'normalized'.
-def normalize_stories(stories):
+#
+# Since a story's normalized values depend only on the normalized values of its children, we normalize the stories in reverse topological order (children before parents), without recursion:
+# Every story starts off waiting on each of its children, a story is normalized as soon as all its children are, and that in turn frees up its own parents.
+# This takes time linear in the number of stories plus the number of dependencies, no matter how long the chains of dependencies are.
+def normalize_stories(stories, one_day=ONE_DAY, profile=None):
 
-    # children_values_dict is a dictionary mapping a tuple of story IDs [here: ('B', 'C')] to a tuple of their max importance and min end_date.
-    children_values_dict = {}
-    
-    # For each story, calculate the max importance and min end_date of its children and potentially change its own importance and end_date based on those values (i.e. normalize the story).
-    for story in stories:
-        normalize_story(story, children_values_dict)
-    
-    #! DEBUG
-    # print('\nchildren_values_dict:\n{}\n'.format(children_values_dict))
+    # Every story we need to look at: the given stories, plus any of their descendants that are not in the 'stories' list itself.
+    # Note that we append to this list while iterating over it.
+    all_stories = list(stories)
 
+    # Dictionary mapping the (Python) identity of each story to its position in 'all_stories'
+    story_positions = {id(story): position for position, story in enumerate(all_stories)}
 
-# NOTE: This can potentially take exponential running time if every parent has a unique set of children but we assume that, in practice, this situation will never arise.
-# Recursive helper function for normalize_stories()
-def normalize_story(story, children_values_dict, one_day=ONE_DAY):
+    # parent_positions[i] contains the positions of the (not yet normalized) parents of all_stories[i] -- a parent appears once per link to that child.
+    parent_positions = [[] for story in all_stories]
 
-    # If the story is already normalized, there's nothing to do
-    if story.is_normalized:
-        return
+    # num_pending_children[i] is the number of links from all_stories[i] to its children that have not been normalized yet
+    num_pending_children = [0] * len(all_stories)
 
-    # Note: When the story was created, if it had no children, we made sure to mark it as normalized right then -- so, at this point, if the story is not already normalized, we know it has children.
-    children = story.children
+    for position, story in enumerate(all_stories):
 
-    # Sort its list of children by their IDs, to ensure consistency if multiple parents query this same group of children.
-    children.sort(key=attrgetter('id'))
+        # If the story is already normalized, it will never need to wait on its children
+        if story.is_normalized:
+            continue
 
-    # See if the max importance and min end_date have already been calculated for this particular group of children.
+        for child in story.children:
 
-    # If they have, then they will already be present in children_values_dict with a key formed from the IDs of the sorted list of children.
-    key = tuple([child.id for child in children])
-    if key in children_values_dict:
-        max_importance, min_end_date = children_values_dict[key]
-    
-    # The max importance and min end_date have not already been calculated for this particular group of children.
-    else:
+            child_position = story_positions.get(id(child))
+            if child_position is None:
+                child_position = story_positions[id(child)] = len(all_stories)
+                all_stories.append(child)
+                parent_positions.append([])
+                num_pending_children.append(0)
 
-        # First ensure each child is normalized
-        for child in children:
-            normalize_story(child, children_values_dict)
-        
-        # Then, using normalized importance and end_date values of all the children, calculate the max importance and min end_date for this group of children.
-        max_importance = max([child.importance for child in children])
-        min_end_date = min([child.end_date for child in children])
+            parent_positions[child_position].append(position)
+            num_pending_children[position] += 1
 
-        # Now that we've calculated the max importance and min end_date for this group of children, save those values to save us time with any future parents of this same group of children.
-        children_values_dict[key] = (max_importance, min_end_date)
+    # Contains the positions of stories that are not waiting on any children, and are thus ready to be normalized
+    ready_positions = [position for position, num_pending in enumerate(num_pending_children) if not num_pending]
+
+    # Number of stories that actually had to be normalized here (rather than already being normalized)
+    num_normalized_stories = 0
+
+    while ready_positions:
+
+        position = ready_positions.pop()
+        story = all_stories[position]
+
+        if not story.is_normalized:
+
+            # Note: When the story was created, if it had no children, we made sure to mark it as normalized right then -- so, at this point, if the story is not already normalized, we know it has children.
+            # All those children have been normalized by now, so use their normalized importance and end_date values to normalize this story.
+            children = story.children
+            max_importance = max([child.importance for child in children])
+            min_end_date = min([child.end_date for child in children])
+
+            if story.importance < max_importance:
+                story.importance = max_importance
+
+            # Just like date objects, going back 1 day from the min possible date is an error
+            latest_end_date = min_end_date - one_day
+            if latest_end_date < MIN_DATE:
+                raise OverflowError('date value out of range')
+
+            if story.end_date > latest_end_date:
+                story.end_date = latest_end_date
+
+            # This story is now normalized
+            story.is_normalized = True
+            num_normalized_stories += 1
+
+        # Now that this story is normalized, its parents no longer need to wait on it
+        for parent_position in parent_positions[position]:
+            num_pending_children[parent_position] -= 1
+            if not num_pending_children[parent_position]:
+                ready_positions.append(parent_position)
+
+    if profile is not None:
+        profile.count('stories_normalized', num_normalized_stories)
+        profile.count('dependency_links_followed', sum(len(positions) for positions in parent_positions))
+
+    # If some stories are still waiting on their children, it means that there is a cycle in their dependencies (eg. A is a prerequisite for B, and B is a prerequisite for A), so they can never be normalized
+    for position, num_pending in enumerate(num_pending_children):
+        if num_pending:
+            raise ValueError('Stories have a dependency cycle: {}'.format(' -> '.join(find_dependency_cycle(all_stories[position]))))
 
-    # Now that we've calculated the required values of this story's children, use them to normalize this story
-    
-    if story.importance < max_importance:
-        story.importance = max_importance
-    
-    if story.end_date > (min_end_date - one_day):
-        story.end_date = min_end_date - one_day
 
-    # This story is now normalized
-    story.is_normalized = True
+# Given a story that depends on a dependency cycle (i.e. a story that could not be normalized), return the list of IDs of the stories in that cycle, in order, with the first story repeated at the end.
+# Eg. ['A', 'B', 'C', 'A']
+def find_dependency_cycle(story):
 
-    return
+    # Each unnormalized story has at least one unnormalized child, so, by repeatedly following unnormalized children, we must eventually revisit a story.
+    path = []
+    path_positions = {}
+    while id(story) not in path_positions:
+        path_positions[id(story)] = len(path)
+        path.append(story)
+        story = next(child for child in story.children if not child.is_normalized)
+
+    cycle = path[path_positions[id(story)]:]
+    return [cycle_story.id for cycle_story in cycle] + [story.id]
 
 
 # Sort stories using the following algorithm:
@@ -350,95 +856,255 @@ def sort_stories(stories):
 
 
 # Slot stories into sprints, following the order of the 'stories' list (if story A appears before story B in the 'stories' list, then A will be slotted into a sprint before B) and the 'sprints' list (if sprint 1 appears before sprint 2 in the 'sprints' list, then we will attempt to slot stories into sprint 1 before sprint 2)
+# NOTE: The 'sprints' list must be sorted by end date (in ascending order), as done by load_sprint_data().
 # Note that, depending on how much space is left in each sprint, even though we try to slot story A into one of the sprints before trying to slot story B, if B is smaller than A, B might end up in an earlier sprint than A (i.e. if that sprint didn't have enough space for A, forcing A to go to the next sprint, but had enough space for B).
-# Thus, even though we have ensured (via normalization and sorting) that, if A is the parent of B, A appears before B in the sorted list of stories, that alone is NOT enough to guarantee that, after slotting the stories, B will not end up in an earler sprint than its parent A! Instead, as seen below, we might need to modify B's start date as well.
-def slot_stories(stories, sprints, id_to_sprint_dict, max_date=MAX_DATE):
+# Thus, even though we have ensured (via normalization and sorting) that, if A is the parent of B, A appears before B in the sorted list of stories, that alone is NOT enough to guarantee that, after slotting the stories, B will not end up in an earler sprint than its parent A! Instead, as seen below, we might need to move B's earliest sprint position (see Story) later as well.
+#
+# If 'previous_sprint_positions' is given, it contains the positions (in the 'sprints' list, or None if not slotted) that the first len(previous_sprint_positions) stories were slotted into by an earlier run, in which those stories came first in the exact same order, with the exact same sprints.
+# Since slotting is greedy, those stories are guaranteed to end up in the same sprints again, so they are just put back into those sprints, without searching for them.
+#
+# If a PlanProfile is given, the slotting counters (see PlanProfile) are added to it.
+def slot_stories(stories, sprints, max_date=MAX_DATE, previous_sprint_positions=(), profile=None):
 
     # The 'stories' and 'sprints' lists might be used even after this function is done -- thus, do NOT directly modify them!
 
-    # Contains stories that we have not yet attempted to slot
-    available_stories = stories.copy()
-
-    # Contains sprints that have available capacity
-    available_sprints = sprints.copy()
+    # is_slotted[i] is True if stories[i] has been slotted into a sprint.
+    # Used instead of removing slotted stories from a copy of the 'stories' list, since each removal would have to search through that entire list.
+    is_slotted = [False] * len(stories)
 
-    # Contains sprints that have no available capacity left.
-    full_sprints = []
+    # Keeps track of which sprints have available capacity, so that we can find the first suitable sprint for each story without checking every sprint
+    sprint_index = SprintIndex(sprints, max_date)
 
-    # Contains all the stories that we were not able to slot into any sprints
-    remaining_stories = []
+    # Number of times a child's earliest sprint position had to be moved later, to keep it from being slotted before its parent
+    num_child_sprint_position_adjustments = 0
 
-    # Since we will be modifying available_stories in this 'for' loop, do NOT iterate over available_stories itself!
+    # Each story's earliest sprint position is only ever moved by its parents, which (thanks to normalization and story sorting) are all slotted before it
     for story in stories:
+        story.earliest_sprint_position = 0
 
-        story_size = story.size
+    children_first_positions = sprint_index.children_first_positions
 
-        for sprint in available_sprints:
+    sprint_index.is_replaying = bool(previous_sprint_positions)
 
-            # Try to slot the story into the first sprint that has enough space for it, and that abides by its start and end date constraints
-            if (sprint.available_capacity >= story_size) \
-                and (sprint.end_date >= story.start_date) \
-                and (sprint.start_date <= story.end_date):
+    for story_position, story in enumerate(stories):
 
-                # If the story is already assigned to someone, only slot it in this sprint if that person has enough available capacity in this sprint
-                # Note that assignee can be None, but assignee_available_capacities will always be a valid dict.
-                assignee = story.assignee
-                assignee_available_capacities = sprint.assignee_available_capacities
-                if assignee in assignee_available_capacities:
-                    if assignee_available_capacities[assignee] >= story_size:
-                        assignee_available_capacities[assignee] -= story_size
-                    else:
-                        # Do not slot this story in this sprint, because the assignee does not have enough capacity to do it in this sprint
-                        continue
+        if story_position < len(previous_sprint_positions):
+            position = previous_sprint_positions[story_position]
+            replay_slot_story(position, story.size, story.start_date, story.end_date, story.assignee, sprints, sprint_index, story.earliest_sprint_position)
+        else:
+            if sprint_index.is_replaying:
+                sprint_index.finish_replay()
+            position = slot_story(story.size, story.start_date, story.end_date, story.assignee, sprints, sprint_index, profile, story.earliest_sprint_position)
 
-                # Slot story into sprint
-                sprint.stories.append(story)
-                sprint.available_capacity -= story_size
-                available_stories.remove(story)
-                story.assigned_sprint_id = sprint.id
-                break
-            
-            elif sprint.available_capacity == 0:
-                full_sprints.append(sprint)
-        
-        # If we know any of the sprints are full, remove it from the 'available_sprints' list so that we don't waste time trying to slot the next story into it
-        for full_sprint in full_sprints:
-            available_sprints.remove(full_sprint)
-        
-        # Now that we've removed all the full sprints from 'available_sprints', reset 'full_sprints'
-        if full_sprints:
-            full_sprints.clear()
+        if position is not None:
+            sprint = sprints[position]
+            sprint.stories.append(story)
+            is_slotted[story_position] = True
+            story.assigned_sprint_id = sprint.id
 
         # If all the sprints are full, don't bother trying to slot the remaining stories
-        if not available_sprints:
-            remaining_stories = available_stories
+        if not sprint_index.num_available_sprints:
             break
 
         # Thanks to normalization and story sorting, we know that, if this story has children, we have not yet attempted to slot them into a sprint yet. 
         # If any of this story's children is smaller than this story, it might accidentally end up slotted into a sprint before this story -- i.e. the sprint schedule might end up calling for the child to be done before the parent! 
-        # To avoid this, after having attempted to slot this story above, we modify each of its children's start date below.
+        # To avoid this, after having attempted to slot this story above, we move each of its children's earliest sprint position below, so that their searches start straight after every sprint that ends before this story's sprint starts.
+        # If this story was not assigned to any sprint, its children cannot be allowed to be assigned to any sprint either (see SprintIndex.children_first_positions).
+        children_first_position = children_first_positions[len(sprints) if position is None else position]
         for child in story.children:
+            if child.earliest_sprint_position < children_first_position:
+                child.earliest_sprint_position = children_first_position
+                num_child_sprint_position_adjustments += 1
+
+    # Every story that was not slotted (whether because there was not enough space for it, or because all the sprints were full before we got to it) is remaining, in the same order as the 'stories' list
+    remaining_stories = [story for story, story_is_slotted in zip(stories, is_slotted) if not story_is_slotted]
+
+    if profile is not None:
+        profile.count('stories_slotted', len(stories) - len(remaining_stories))
+        profile.count('stories_not_slotted', len(remaining_stories))
+        profile.count('previous_placements_replayed', min(len(previous_sprint_positions), len(stories)))
+        profile.count('child_sprint_position_adjustments', num_child_sprint_position_adjustments)
+
+    return remaining_stories
+
+
+# Slots stories into the sprints a few sprints at a time (a rolling horizon), rather than all of them at once like slot_stories() -- so that the next few sprints can be planned without spending time on far-future ones.
+# Each call to resolve() fills the next sprints of the (end date sorted) 'sprints' list, and the object itself is the continuation: it keeps the stories that have not been slotted yet (in order), so that more sprints can be resolved later on.
+# Every sprint that has been resolved ends up with exactly the same stories (and available capacities) as it would after slot_stories(), and once every sprint has been resolved, so do the remaining stories.
+#
+# How this stays identical to slot_stories(): a story that doesn't fit into any of the sprints being resolved would be slotted into a later sprint (or none) by slot_stories(), which can't affect those sprints.
+# Its children can only go into sprints that end no earlier than its sprint starts, so each resolve() call extends its sprints past any later sprint that starts on or before the last one's end date -- then, those children can't go into any of its sprints either.
+# Those stories are simply slotted (in the same order) into the sprints of the next resolve() call, whose state only depends on the stories that went into them.
+class HorizonPlan:
+
+    def __init__(self, stories, sprints, max_date=MAX_DATE):
+
+        # The 'stories' and 'sprints' lists might be used even after this is done -- thus, do NOT directly modify them!
+        self.sprints = sprints
+        self.max_date = max_date
+
+        # Stories that have not been slotted into any of the sprints resolved so far, in the same order as the 'stories' list
+        self.unresolved_stories = list(stories)
+        for story in stories:
+            story.earliest_sprint_position = 0
+
+        # Same as SprintIndex.children_first_positions, for the whole 'sprints' list (stories' earliest sprint positions are positions in the whole list, rather than in the sprints being resolved)
+        sprint_end_dates = [sprint.end_date for sprint in sprints]
+        self.children_first_positions = [bisect_left(sprint_end_dates, sprint.start_date) for sprint in sprints] + [bisect_left(sprint_end_dates, max_date)]
+
+        # The sprints before this position in the 'sprints' list have been resolved
+        self.num_resolved_sprints = 0
+
+        # Whether resolve() has gone through the stories yet (if there are no sprints, it still does so once, so that every story is found to be unresolved)
+        self.is_started = False
+
+        # min_later_start_dates[i] is the earliest start date of the sprints from position i onwards
+        self.min_later_start_dates = [max_date] * (len(sprints) + 1)
+        for position in range(len(sprints) - 1, -1, -1):
+            self.min_later_start_dates[position] = min(sprints[position].start_date, self.min_later_start_dates[position + 1])
+
+    def is_complete(self):
+        return self.num_resolved_sprints == len(self.sprints)
+
+    # Return the list of stories that could not be slotted into any sprint -- only known once every sprint has been resolved
+    def get_remaining_stories(self):
+
+        if not self.is_complete():
+            raise ValueError('Stories that are not slotted into the sprints resolved so far might still be slotted into later sprints -- resolve every sprint first!')
+
+        return self.unresolved_stories
+
+    # Slot the unresolved stories into (at least) the next 'num_sprints' sprints, and return the list of sprints that were resolved.
+    # If a PlanProfile is given, the same counters as slot_stories() adds are added to it -- pass the same one to every call, so that 'stories_not_slotted' ends up as the number of stories left unresolved.
+    def resolve(self, num_sprints, profile=None):
+
+        start_position = self.num_resolved_sprints
+        end_position = min(start_position + max(num_sprints, 0), len(self.sprints))
+
+        # Don't split up sprints that overlap (see above)
+        while (start_position < end_position < len(self.sprints)) and (self.min_later_start_dates[end_position] <= self.sprints[end_position - 1].end_date):
+            end_position += 1
+
+        if (end_position == start_position) and (self.is_started or self.sprints):
+            return []
+
+        # Number of times a child's earliest sprint position had to be moved later, to keep it from being slotted before its parent
+        num_child_sprint_position_adjustments = 0
 
-            # If this story was assigned to a sprint, ensure that all the children's start dates are no earlier than the start of that sprint -- i.e. ensure that the children cannot be assigned to a sprint prior to the sprint that their parent was assigned to.
-            if story.assigned_sprint_id:
-                assigned_sprint = id_to_sprint_dict[story.assigned_sprint_id]
-                earliest_start_date_for_children = assigned_sprint.start_date
-            
-            # If this story was not assigned to any sprint, its children cannot be allowed to be assigned to any sprint either! 
-            # The easiest way to achieve this is to set their start dates to a date guaranteed to be after the very last sprint's end date.
+        sprints = self.sprints[start_position:end_position]
+        sprint_index = SprintIndex(sprints, self.max_date)
+
+        # The children of stories that are not slotted into these sprints can't be slotted into them either.
+        # If there are sprints after these ones, the children's earliest sprint positions are moved again once their parent is slotted (or not), just like with slot_stories() -- this position is never later than that one.
+        if end_position < len(self.sprints):
+            unslotted_children_first_position = end_position
+        else:
+            unslotted_children_first_position = self.children_first_positions[-1]
+
+        unresolved_stories = []
+        for story in self.unresolved_stories:
+
+            # If all these sprints are full, the rest of the stories are left for the sprints after them (but their children's earliest sprint positions still need to be moved)
+            position = None
+            if sprint_index.num_available_sprints:
+                position = slot_story(story.size, story.start_date, story.end_date, story.assignee, sprints, sprint_index, profile, max(story.earliest_sprint_position - start_position, 0))
+
+            if position is not None:
+                sprint = sprints[position]
+                sprint.stories.append(story)
+                story.assigned_sprint_id = sprint.id
+                children_first_position = self.children_first_positions[start_position + position]
             else:
-                earliest_start_date_for_children = max_date
+                unresolved_stories.append(story)
+                children_first_position = unslotted_children_first_position
+
+            # Keep children from being slotted before their parent (see slot_stories())
+            for child in story.children:
+                if child.earliest_sprint_position < children_first_position:
+                    child.earliest_sprint_position = children_first_position
+                    num_child_sprint_position_adjustments += 1
+
+        if profile is not None:
+            num_stories_slotted = len(self.unresolved_stories) - len(unresolved_stories)
+            profile.count('stories_slotted', num_stories_slotted)
+            profile.count('stories_not_slotted', -num_stories_slotted if self.is_started else len(unresolved_stories))
+            profile.count('previous_placements_replayed', 0)
+            profile.count('child_sprint_position_adjustments', num_child_sprint_position_adjustments)
+
+        self.unresolved_stories = unresolved_stories
+        self.num_resolved_sprints = end_position
+        self.is_started = True
+
+        return sprints
+
+
+# Slot a single story (given its size, start and end dates, and assignee) into the first sprint that has enough space for it, and update that sprint's available capacities and 'sprint_index' accordingly.
+# Returns the position (in the 'sprints' list) of the sprint that the story was slotted into, or None if it could not be slotted into any sprint.
+# NOTE: This does NOT add the story to the sprint's list of stories -- that is up to the caller, since the caller decides how stories are represented.
+#
+# Sprints before 'first_position' are never considered for the story (eg. because they start before its parents' sprints).
+#
+# If a PlanProfile is given, the number of sprints probed for this story (i.e. that had enough space for the story and had to be checked further) and the number of those that were rejected because of their assignee capacity are added to it.
+def slot_story(story_size, story_start_date, story_end_date, assignee, sprints, sprint_index, profile=None, first_position=0):
 
-            if child.start_date < earliest_start_date_for_children:
-                child.start_date = earliest_start_date_for_children
+    num_assignee_capacity_rejections = sprint_index.num_assignee_capacity_rejections
 
-    # Enter this 'else' clause if we did NOT exit the above 'for' loop by breaking out of it.
+    # Slot the story into the first sprint that has enough space for it (and enough available capacity for its assignee, if any), and that abides by its start and end date constraints
+    # Note that assignee can be None, but assignee_available_capacities will always be a valid dict.
+    position = sprint_index.find_first_sprint(story_size, story_start_date, story_end_date, first_position, assignee)
+    if position is not None:
+
+        sprint = sprints[position]
+        if assignee in sprint.assignee_available_capacities:
+            sprint.assignee_available_capacities[assignee] -= story_size
+
+        sprint.available_capacity -= story_size
+        sprint_index.update_sprint(position, assignee)
+
+    num_assignee_capacity_rejections = sprint_index.num_assignee_capacity_rejections - num_assignee_capacity_rejections
+
+    # If we know any of the sprints we skipped past are full, stop considering them so that we don't waste time trying to slot the next story into them
+    if position is None:
+        end_position = len(sprints)
     else:
+        end_position = position
+    sprint_index.remove_full_sprints_before(end_position, sprint_index.find_assignee_skipped_full_sprints(end_position, story_size, story_start_date, story_end_date, assignee, first_position))
 
-        # It is possible to have stories remaining (unslotted) without having already placed them in remaining_stories:
-        #   a) If there is not enough space in the remaining sprints to slot in the remaining stories, but the remaining sprints are NOT full!
-        #   b) If the last sprint was perfectly filled when the final story in the 'stories' list was slotted in -- note that there are still other unslotted stories in the 'stories' list, but there wasn't enough space to slot them in, so they were skipped over before we got to this final story.
-        if available_stories:
-            remaining_stories = available_stories
-    
-    return remaining_stories
\ No newline at end of file
+    if profile is not None:
+        # Every sprint that was probed was either rejected because of its assignee capacity, or is the one the story was slotted into
+        num_sprints_probed = num_assignee_capacity_rejections + (position is not None)
+        profile.count('stories_searched')
+        profile.count('sprints_probed', num_sprints_probed)
+        profile.count_max('max_sprints_probed_per_story', num_sprints_probed)
+        profile.count('assignee_capacity_rejections', num_assignee_capacity_rejections)
+
+    return position
+
+
+# Put a single story back into the sprint at the given position (or None, if the story was not slotted) that an earlier call to slot_story() slotted it into, given the exact same story and the exact same state of the sprints.
+# This leaves the sprints and 'sprint_index' in exactly the same state as that call to slot_story() did, without having to search for the sprint.
+def replay_slot_story(position, story_size, story_start_date, story_end_date, assignee, sprints, sprint_index, first_position=0):
+
+    if position is None:
+        end_position = len(sprints)
+
+    else:
+
+        # Make sure that the earlier slot_story() call could actually have chosen this sprint
+        sprint = sprints[position]
+        if (not sprint_index.is_sprint_available(position)) \
+            or (position < first_position) \
+            or (sprint.available_capacity < story_size) \
+            or (sprint.end_date < story_start_date) \
+            or (sprint.start_date > story_end_date):
+            raise ValueError('Sprint {} does not have space for a story of size {} between {} and {}: The previous plan does not match the sprints and stories!'.format(sprint.id, story_size, convert_day_to_date(story_start_date), convert_day_to_date(story_end_date)))
+
+        assignee_available_capacities = sprint.assignee_available_capacities
+        if assignee in assignee_available_capacities:
+            assignee_available_capacities[assignee] -= story_size
+
+        sprint.available_capacity -= story_size
+        sprint_index.update_sprint(position, assignee)
+        end_position = position
+
+    sprint_index.remove_full_sprints_before(end_position, sprint_index.find_assignee_skipped_full_sprints(end_position, story_size, story_start_date, story_end_date, assignee, first_position))
@@ -3,80 +3,209 @@
 __author__ = 'Pranav Marla'
 
 
-from collections import OrderedDict
 from datetime import date, datetime
+import cache
+import columnar
+import incremental
 import json
 import lib
+import optimizer
+import os
+import time
+import writers
 
 
-input_file_path = lib.parse_command_line_args()
+input_file_path, use_columnar, delta_file_path, previous_output_file_path, use_profile, optimize_time_budget, quiet, output_format, output_file_path, cache_dir_path, max_cache_bytes, horizon = lib.parse_command_line_args()
 
-sprints, id_to_sprint_dict, stories, id_to_story_dict = lib.load_input_data(input_file_path)
+# If requested, record how long each phase takes (and how much memory it uses), along with counters from the hot paths, and save them to profile.json
+profile = lib.PlanProfile() if use_profile else None
 
-# Populate list of children
-lib.populate_children_from_ids(stories, id_to_story_dict)
+def start_phase(phase_name):
+    if profile is not None:
+        profile.start_phase(phase_name)
 
 
-#! DEBUG
-# print('Stories, after populating kids, before normalizing:\n')
-# for story in stories:
-#     print('\t{}\n'.format(story))
-# print()
+# Huge inputs can be provided in the streaming NDJSON format instead
+is_ndjson_input = lib.is_ndjson_file(input_file_path)
+load_start_time = time.perf_counter()
+start_phase('load')
 
+if optimize_time_budget and (use_columnar or delta_file_path):
+    raise ValueError('The optimizer (--optimize) cannot be used with the columnar backend (--columnar) or incremental re-planning (--delta)!')
 
-# Normalize stories
-lib.normalize_stories(stories)
+if cache_dir_path and (use_columnar or delta_file_path):
+    raise ValueError('The cache (--cache-dir) cannot be used with the columnar backend (--columnar) or incremental re-planning (--delta)!')
 
+if horizon < 0:
+    raise ValueError('The horizon (--horizon) cannot be negative!')
 
-#! DEBUG
-# print('Stories, after normalizing, before sorting:\n')
-# for story in stories:
-#     print('\t{}\n'.format(story))
-# print()
+if horizon and (use_columnar or delta_file_path or optimize_time_budget):
+    raise ValueError('A horizon (--horizon) cannot be used with the columnar backend (--columnar), incremental re-planning (--delta) or the optimizer (--optimize)!')
 
+# Re-plan incrementally, given the previous plan and only the stories that have changed since then.
+# This produces exactly the same results as a full run on the updated input.
+if delta_file_path:
 
-# Sort stories
-lib.sort_stories(stories)
+    if use_columnar:
+        raise ValueError('Incremental re-planning (--delta) cannot be used with the columnar backend (--columnar)!')
 
+    start_phase('replan')
+    sprints, id_to_sprint_dict, remaining_stories, num_undisturbed_stories, moved_stories = incremental.replan(input_file_path, delta_file_path, previous_output_file_path or 'output.json', profile)
+    print('Re-planned incrementally: {} stories were put back into their previous sprints without being re-slotted\n'.format(num_undisturbed_stories))
 
-#! DEBUG
-# print('Stories, after sorting:')
-# for story in stories:
-#     print(repr(story))
-#     print('\t{}'.format(story))
-# print()
+# For inputs with millions of stories, use the array-backed story store, which produces the same results in a fraction of the memory and time
+elif use_columnar:
+
+    sprints, id_to_sprint_dict, story_columns = columnar.load_input_columns(input_file_path)
+    num_stories = len(story_columns)
+
+# If this input's stories have been preprocessed before, load them already populated with their children, normalized and sorted
+elif cache_dir_path:
+    sprints, id_to_sprint_dict, stories, is_cache_hit = cache.load_preprocessed_input(input_file_path, cache_dir_path, max_cache_bytes)
+    num_stories = len(stories)
+
+elif is_ndjson_input:
+    sprints, id_to_sprint_dict, stories, id_to_story_dict = lib.load_ndjson_input_data(input_file_path)
+    num_stories = len(stories)
+
+else:
+    sprints, id_to_sprint_dict, stories, id_to_story_dict = lib.load_input_data(input_file_path)
+    num_stories = len(stories)
+
+load_duration = time.perf_counter() - load_start_time
+if cache_dir_path:
+    print('{} {} preprocessed stories in {:.3f} seconds\n'.format('Loaded' if is_cache_hit else 'Cached', num_stories, load_duration))
+elif (is_ndjson_input or use_columnar) and not delta_file_path:
+    print('Loaded {} stories in {:.3f} seconds ({:.0f} stories/second)\n'.format(num_stories, load_duration, num_stories / load_duration if load_duration else 0))
+
+
+if use_columnar:
+
+    # Normalize, sort and slot stories
+    start_phase('normalize_stories')
+    story_columns.normalize()
+    start_phase('sort_stories')
+    sorted_rows = story_columns.sorted_rows()
+    start_phase('slot_stories')
+    remaining_stories = columnar.slot_story_columns(story_columns, sorted_rows, sprints, profile=profile)
+
+# Unless we already re-planned incrementally, or loaded already preprocessed stories from the cache, above
+elif not (delta_file_path or cache_dir_path):
+
+    # Populate list of children
+    start_phase('populate_children_from_ids')
+    lib.populate_children_from_ids(stories, id_to_story_dict)
+
+
+    #! DEBUG
+    # print('Stories, after populating kids, before normalizing:\n')
+    # for story in stories:
+    #     print('\t{}\n'.format(story))
+    # print()
+
+
+    # Normalize stories
+    start_phase('normalize_stories')
+    lib.normalize_stories(stories, profile=profile)
+
+
+    #! DEBUG
+    # print('Stories, after normalizing, before sorting:\n')
+    # for story in stories:
+    #     print('\t{}\n'.format(story))
+    # print()
+
+
+    # Sort stories
+    start_phase('sort_stories')
+    lib.sort_stories(stories)
+
+
+    #! DEBUG
+    # print('Stories, after sorting:')
+    # for story in stories:
+    #     print(repr(story))
+    #     print('\t{}'.format(story))
+    # print()
 
 
 # Slot stories
-remaining_stories = lib.slot_stories(stories, sprints, id_to_sprint_dict)
-
-print('Sprints, after slotting in stories:')
-for sprint in sprints:
-    print('-------------')
-    print('Sprint {}:\tCapacity remaining: {}/{}\n'.format(sprint.id, sprint.available_capacity, sprint.total_capacity))
-    
-    for story in sprint.stories:
-        print(story)
-    print()
+if not (use_columnar or delta_file_path):
+    start_phase('slot_stories')
+    if optimize_time_budget:
+        remaining_stories, optimizer_report_dict = optimizer.optimize_plan(stories, sprints, optimize_time_budget)
 
-    if sprint.assignee_total_capacities:
-        print('\t-------------\n')
-        print('\tAssignee Workload:')
-        for assignee, assignee_remaining_capacity in sprint.assignee_available_capacities.items():
-            assignee_total_capacity = sprint.assignee_total_capacities[assignee]
-            print('\t\t{}:\t{}/{}'.format(assignee, assignee_total_capacity - assignee_remaining_capacity, assignee_total_capacity))
-        print()
+    # Only plan the first few sprints: the stories that are left over weren't slotted into any of them, but might still fit into the later sprints
+    elif horizon:
+        horizon_plan = lib.HorizonPlan(stories, sprints)
+        sprints = horizon_plan.resolve(horizon, profile)
+        remaining_stories = horizon_plan.unresolved_stories
+        print('Planned the first {} of {} sprints\n'.format(len(sprints), len(horizon_plan.sprints)))
+
+    else:
+        remaining_stories = lib.slot_stories(stories, sprints, profile=profile)
+
+start_phase('print_results')
 
-    print('-------------\n')
+# Printing every story is slower than planning them for big plans, so it can be turned off
+if quiet:
+    num_slotted_stories = sum(len(sprint.stories) for sprint in sprints)
+    print('Slotted {} stories into {} sprints ({} stories could not be slotted into any {})\n'.format(num_slotted_stories, len(sprints), len(remaining_stories), 'of these sprints' if horizon else 'sprint'))
 
-if remaining_stories:
-    print('The following stories could not be slotted into any sprint:')
-    for story in remaining_stories:
-        print(story)
 else:
-    print('All stories were successfully slotted into sprints!')
 
-print()
+    print('Sprints, after slotting in stories:')
+    for sprint in sprints:
+        print('-------------')
+        print('Sprint {}:\tCapacity remaining: {}/{}\n'.format(sprint.id, sprint.available_capacity, sprint.total_capacity))
+        
+        for story in sprint.stories:
+            print(story)
+        print()
+
+        if sprint.assignee_total_capacities:
+            print('\t-------------\n')
+            print('\tAssignee Workload:')
+            for assignee, assignee_remaining_capacity in sprint.assignee_available_capacities.items():
+                assignee_total_capacity = sprint.assignee_total_capacities[assignee]
+                print('\t\t{}:\t{}/{}'.format(assignee, assignee_total_capacity - assignee_remaining_capacity, assignee_total_capacity))
+            print()
+
+        print('-------------\n')
+
+    if remaining_stories and horizon:
+        print('The following stories could not be slotted into any of these sprints:')
+        for story in remaining_stories:
+            print(story)
+    elif remaining_stories:
+        print('The following stories could not be slotted into any sprint:')
+        for story in remaining_stories:
+            print(story)
+    else:
+        print('All stories were successfully slotted into sprints!')
+
+    print()
+
+# When re-planning, it's hard to see what changed since the program is moving the stories around, so spell it out
+if delta_file_path:
+
+    if quiet:
+        print('{} stories moved between sprints.\n'.format(len(moved_stories)))
+
+    else:
+
+        if moved_stories:
+            print('The following stories moved between sprints:')
+            for story_id, previous_sprint_id, sprint_id in moved_stories:
+                print('\t{}:\t{} -> {}'.format(story_id, 'Remaining' if previous_sprint_id is None else 'Sprint {}'.format(previous_sprint_id), 'Remaining' if sprint_id is None else 'Sprint {}'.format(sprint_id)))
+        else:
+            print('No stories moved between sprints.')
+
+        print()
+
+if optimize_time_budget:
+    print('Optimizer: slotted {optimized_points_slotted} story points ({optimized_utilization:.1%} of capacity), versus {greedy_points_slotted} ({greedy_utilization:.1%}) for the greedy plan'.format(**optimizer_report_dict))
+    print('Optimizer: explored {} search nodes in {:.3f} seconds -- {}\n'.format(optimizer_report_dict['search_nodes'], optimizer_report_dict['seconds'], 'this plan is optimal' if optimizer_report_dict['is_optimal'] else 'ran out of time, so this is the best plan found so far'))
 
 
 #! DEBUG
@@ -87,20 +216,22 @@ print()
 # print()
 
 
-# Create a more compact, consistent representation of the results, for easy comparison, and save to output JSON file.
-# Ensure that, given the same input, the same output is consistently generated!
-output_dict = OrderedDict()
-for sprint in sprints:
-
-    sprint_dict = output_dict[sprint.id] = OrderedDict()
-    sprint_dict['Stories'] = [story.id for story in sprint.stories]
-
-    sprint_assignees_dict = sprint_dict['Assignee Workload'] = OrderedDict()
-    for assignee, assignee_remaining_capacity in sprint.assignee_available_capacities.items():
-            assignee_total_capacity = sprint.assignee_total_capacities[assignee]
-            sprint_assignees_dict[assignee] = sprint.assignee_total_capacities[assignee] - assignee_remaining_capacity
-
-output_dict['Remaining'] = [story.id for story in remaining_stories]
-
-with open('output.json', 'w') as output_file:
-    output_file.write(json.dumps(output_dict, indent=4))
+# Save a more compact, consistent representation of the results, for easy comparison.
+# It's written one sprint at a time, rather than building the whole thing in memory first.
+start_phase('save_output')
+output_file_path = output_file_path or 'output' + writers.OUTPUT_FORMATS[output_format][1]
+writers.save_output(output_file_path, sprints, remaining_stories, output_format)
+
+# Save the order that the stories were slotted in next to the output file, so that this plan can be re-planned incrementally (see incremental.py).
+# Any other kind of run (including the optimizer, whose plans are not greedy, and horizon runs, which only plan some of the sprints) leaves no order file behind, since an order file left over from an earlier plan would no longer match the output file.
+# Only JSON output files can be re-planned from (see --previous-output), so other formats leave any order file alone.
+if output_format in ('json', 'compact-json'):
+    order_file_path = incremental.get_order_file_path(output_file_path)
+    if not (use_columnar or delta_file_path or optimize_time_budget or horizon):
+        incremental.save_order_file(order_file_path, input_file_path, stories)
+    elif os.path.exists(order_file_path):
+        os.remove(order_file_path)
+
+if profile is not None:
+    with open('profile.json', 'w') as profile_file:
+        profile_file.write(json.dumps(profile.to_dict(), indent=4))
@@ -0,0 +1,306 @@
+__author__ = 'Pranav Marla'
+
+
+# Optional alternative to the greedy first-fit slotting done by lib.slot_stories(): a branch-and-bound search for a better plan, within a time budget.
+#
+# Greedy first-fit can leave sprints with idle capacity while lower importance stories end up unslotted (eg. a big story takes the last space in a sprint that two smaller stories could have shared with another story).
+# The search keeps every rule of the greedy plan (importance, start/end dates, sprint and assignee capacities, and prerequisites never being slotted after the stories that depend on them), and compares plans by how many story points they slot at each importance level, most important level first.
+# Thus, a plan is only ever considered better if it slots more points of some importance level without slotting fewer points of any more important level -- so it will never give up a more important story to fit in less important ones.
+#
+# The search starts from the greedy plan, so the plan it returns is never worse than the greedy plan, and, if it runs out of time, it returns the best plan found so far.
+
+
+import lib
+import time
+
+
+# Max number of search states to remember, so that memory use stays bounded no matter how long the search runs
+MAX_MEMO_ENTRIES = 200000
+
+# How many search nodes to visit between checks of whether the time budget has run out
+NODES_PER_TIME_CHECK = 256
+
+
+# Given normalized and sorted (but not yet slotted) stories, and freshly created sprints, slot the stories into the sprints, using the best plan found within 'time_budget' seconds.
+# Returns the list of stories that could not be slotted into any sprint (just like lib.slot_stories()), as well as a dictionary describing how the plan compares to the greedy plan.
+def optimize_plan(stories, sprints, time_budget):
+
+    start_time = time.perf_counter()
+
+    # First, come up with the greedy plan (which we'll try to improve on), then undo it
+    lib.slot_stories(stories, sprints)
+
+    sprint_positions = {sprint.id: position for position, sprint in enumerate(sprints)}
+    greedy_sprint_positions = [sprint_positions.get(story.assigned_sprint_id) for story in stories]
+
+    for story in stories:
+        story.assigned_sprint_id = None
+
+    for sprint in sprints:
+        sprint.reset()
+
+    search = PlanSearch(stories, sprints)
+    greedy_points_by_level = search.points_by_level(greedy_sprint_positions)
+    best_sprint_positions, best_points_by_level, is_optimal = search.run(greedy_sprint_positions, greedy_points_by_level, start_time + time_budget)
+
+    # Slot the stories according to the best plan.
+    # Stories are added to each sprint in the order they're sorted in, just like with the greedy plan.
+    remaining_stories = []
+    for story, position in zip(stories, best_sprint_positions):
+
+        if position is None:
+            remaining_stories.append(story)
+            continue
+
+        sprint = sprints[position]
+        sprint.stories.append(story)
+        sprint.available_capacity -= story.size
+        if story.assignee in sprint.assignee_available_capacities:
+            sprint.assignee_available_capacities[story.assignee] -= story.size
+        story.assigned_sprint_id = sprint.id
+
+    total_capacity = sum(sprint.total_capacity for sprint in sprints)
+    greedy_points = sum(greedy_points_by_level)
+    best_points = sum(best_points_by_level)
+
+    report_dict = \
+        {
+            'greedy_points_slotted': greedy_points,
+            'optimized_points_slotted': best_points,
+            'total_capacity': total_capacity,
+            'greedy_utilization': greedy_points / total_capacity if total_capacity else 0,
+            'optimized_utilization': best_points / total_capacity if total_capacity else 0,
+            'is_optimal': is_optimal,
+            'search_nodes': search.num_nodes,
+            'seconds': time.perf_counter() - start_time
+        }
+
+    return (remaining_stories, report_dict)
+
+
+# Depth-first branch-and-bound search over plans: for each story (in sorted order), try each sprint it could go in (earliest first), and then try leaving it unslotted.
+# Branches are cut off when even their most optimistic outcome can't beat the best plan found so far, or when an equivalent state has already been reached by an equal or better partial plan.
+class PlanSearch:
+
+    def __init__(self, stories, sprints):
+
+        self.sprints = sprints
+        num_stories = len(stories)
+
+        # Importance levels, from most important (level 0) to least important
+        importances = sorted(set(story.importance for story in stories), reverse=True)
+        importance_levels = {importance: level for level, importance in enumerate(importances)}
+        self.num_levels = len(importances)
+
+        story_positions = {id(story): position for position, story in enumerate(stories)}
+
+        self.sizes = [story.size for story in stories]
+        self.levels = [importance_levels[story.importance] for story in stories]
+        self.start_dates = [story.start_date for story in stories]
+        self.end_dates = [story.end_date for story in stories]
+        self.assignees = [story.assignee for story in stories]
+
+        # Positions of each story's children that come after it (normalization and sorting ensure that they all do)
+        self.children = [[story_positions[id(child)] for child in story.children if story_positions.get(id(child), -1) > position] for position, story in enumerate(stories)]
+
+        # Positions of the stories that have a parent, in ascending order -- their constraints are part of the search state
+        has_parent = [False] * num_stories
+        for children in self.children:
+            for child in children:
+                has_parent[child] = True
+        self.child_positions = [position for position in range(num_stories) if has_parent[position]]
+
+        self.num_nodes = 0
+
+    # Return the number of story points slotted at each importance level, for the given plan
+    def points_by_level(self, sprint_positions):
+
+        points_by_level = [0] * self.num_levels
+        for position, sprint_position in enumerate(sprint_positions):
+            if sprint_position is not None:
+                points_by_level[self.levels[position]] += self.sizes[position]
+
+        return points_by_level
+
+    # Search for a plan that slots more points than the given (greedy) plan, until the search is complete or the deadline (as a time.perf_counter() value) is reached.
+    # Returns the best plan found (as the position of the sprint each story is slotted into, or None), its points slotted at each importance level, and whether it is known to be optimal (i.e. the search was completed).
+    def run(self, best_sprint_positions, best_points_by_level, deadline):
+
+        sprints = self.sprints
+        sizes = self.sizes
+        levels = self.levels
+        end_dates = self.end_dates
+        assignees = self.assignees
+        children = self.children
+        num_stories = len(sizes)
+
+        sprint_start_dates = [sprint.start_date for sprint in sprints]
+        sprint_end_dates = [sprint.end_date for sprint in sprints]
+
+        # The state being searched, which is modified as stories are slotted (or not), and restored when backtracking
+        capacities = [sprint.available_capacity for sprint in sprints]
+        assignee_capacities = [sprint.assignee_available_capacities.copy() for sprint in sprints]
+        assignee_capacity_keys = [sorted(capacities_dict) for capacities_dict in assignee_capacities]
+        remaining_capacity = sum(max(capacity, 0) for capacity in capacities)
+
+        # Earliest date that each story's sprint can end on (its own start date, pushed later by the sprints of its parents), and the number of its parents that were left unslotted
+        earliest_end_dates = list(self.start_dates)
+        num_unslotted_parents = [0] * num_stories
+
+        points_by_level = [0] * self.num_levels
+        unslotted_points_by_level = [0] * self.num_levels
+        for position in range(num_stories):
+            unslotted_points_by_level[levels[position]] += sizes[position]
+
+        sprint_positions = [None] * num_stories
+
+        # Dictionary mapping search state to the best points (by level) that any partial plan reaching that state has slotted so far
+        memo = {}
+
+        best_sprint_positions = list(best_sprint_positions)
+        best_points_by_level = list(best_points_by_level)
+
+        # Each frame is [candidate sprint positions for the story, index of the next candidate to try, list of (child, previous earliest end date) changes to undo]
+        frames = []
+        is_complete = True
+
+        def apply(position, sprint_position):
+
+            nonlocal remaining_capacity
+
+            size = sizes[position]
+            level = levels[position]
+            unslotted_points_by_level[level] -= size
+            sprint_positions[position] = sprint_position
+            changes = []
+
+            if sprint_position is None:
+                for child in children[position]:
+                    num_unslotted_parents[child] += 1
+                return changes
+
+            capacities[sprint_position] -= size
+            remaining_capacity -= size
+            sprint_assignee_capacities = assignee_capacities[sprint_position]
+            if assignees[position] in sprint_assignee_capacities:
+                sprint_assignee_capacities[assignees[position]] -= size
+            points_by_level[level] += size
+
+            sprint_start_date = sprint_start_dates[sprint_position]
+            for child in children[position]:
+                if earliest_end_dates[child] < sprint_start_date:
+                    changes.append((child, earliest_end_dates[child]))
+                    earliest_end_dates[child] = sprint_start_date
+
+            return changes
+
+        def undo(position, sprint_position, changes):
+
+            nonlocal remaining_capacity
+
+            size = sizes[position]
+            level = levels[position]
+            unslotted_points_by_level[level] += size
+            sprint_positions[position] = None
+
+            if sprint_position is None:
+                for child in children[position]:
+                    num_unslotted_parents[child] -= 1
+                return
+
+            capacities[sprint_position] += size
+            remaining_capacity += size
+            sprint_assignee_capacities = assignee_capacities[sprint_position]
+            if assignees[position] in sprint_assignee_capacities:
+                sprint_assignee_capacities[assignees[position]] += size
+            points_by_level[level] -= size
+
+            for child, earliest_end_date in reversed(changes):
+                earliest_end_dates[child] = earliest_end_date
+
+        # Returns True if the search should not go any deeper from the current state, at the given story
+        def is_pruned(position):
+
+            # Even if every remaining story of every level was slotted (as far as the total remaining capacity allows), could this beat the best plan?
+            optimistic_points_by_level = [points + min(unslotted_points, remaining_capacity) for points, unslotted_points in zip(points_by_level, unslotted_points_by_level)]
+            if optimistic_points_by_level <= best_points_by_level:
+                return True
+
+            # Have we already been in this exact state with at least as many points slotted at each level (by importance)? The rest of the search from here would then be the same, but starting from no better.
+            state = \
+                (
+                    position,
+                    tuple(capacities),
+                    tuple(sprint_assignee_capacities[assignee] for sprint_assignee_capacities, keys in zip(assignee_capacities, assignee_capacity_keys) for assignee in keys),
+                    tuple((earliest_end_dates[child], num_unslotted_parents[child] > 0) for child in self.child_positions if child >= position)
+                )
+            previous_points_by_level = memo.get(state)
+            if (previous_points_by_level is not None) and (points_by_level <= previous_points_by_level):
+                return True
+
+            if len(memo) >= MAX_MEMO_ENTRIES:
+                memo.clear()
+            memo[state] = list(points_by_level)
+
+            return False
+
+        # Returns the positions of the sprints that the given story can be slotted into in the current state (earliest first), followed by None (i.e. leaving it unslotted)
+        def find_candidates(position):
+
+            candidates = []
+
+            if not num_unslotted_parents[position]:
+
+                size = sizes[position]
+                assignee = assignees[position]
+                earliest_end_date = earliest_end_dates[position]
+                end_date = end_dates[position]
+
+                for sprint_position in range(len(sprints)):
+                    if (capacities[sprint_position] >= size) \
+                        and (sprint_end_dates[sprint_position] >= earliest_end_date) \
+                        and (sprint_start_dates[sprint_position] <= end_date) \
+                        and (assignee_capacities[sprint_position].get(assignee, size) >= size):
+                        candidates.append(sprint_position)
+
+            candidates.append(None)
+            return candidates
+
+        while True:
+
+            self.num_nodes += 1
+            if (self.num_nodes % NODES_PER_TIME_CHECK == 0) and (time.perf_counter() >= deadline):
+                is_complete = False
+                break
+
+            position = len(frames)
+
+            # Go deeper, unless we've reached the end of the stories or this branch can be cut off
+            if position < num_stories and not is_pruned(position):
+                candidates = find_candidates(position)
+                frames.append([candidates, 1, apply(position, candidates[0])])
+                continue
+
+            if (position == num_stories) and (points_by_level > best_points_by_level):
+                best_points_by_level = list(points_by_level)
+                best_sprint_positions = list(sprint_positions)
+
+            # Backtrack to the latest story that still has candidates left to try
+            while frames:
+
+                frame = frames[-1]
+                frame_position = len(frames) - 1
+                candidates, next_candidate_index, changes = frame
+                undo(frame_position, candidates[next_candidate_index - 1], changes)
+
+                if next_candidate_index < len(candidates):
+                    frame[1] += 1
+                    frame[2] = apply(frame_position, candidates[next_candidate_index])
+                    break
+
+                frames.pop()
+
+            if not frames:
+                break
+
+        return (best_sprint_positions, best_points_by_level, is_complete)
@@ -0,0 +1,234 @@
+#! /usr/bin/env python3
+
+__author__ = 'Pranav Marla'
+
+
+# Answers "how much more capacity (or how many more sprints) do we need, for every story to be slotted?", by planning the backlog over and over while binary searching for the smallest answer.
+#
+# Eg.
+#   ./search.py --input backlog.json --search capacity                          Min extra capacity to add to every sprint
+#   ./search.py --input backlog.json --search assignee-capacity --assignee ann  Min extra capacity to add to ann's capacity in every sprint that limits it (so that none of ann's stories are left over)
+#   ./search.py --input backlog.json --search sprints                           Min number of extra sprints to add after the last one
+#
+# Extra sprints are copies of the last sprint (same length, capacity and assignee capacities), one after the other, starting the day after the last sprint ends.
+#
+# The backlog is only loaded, normalized and sorted once: each trial just changes the sprints' capacities (or adds sprints) and re-plans, using lib.Planner and Sprint.reset() to undo the previous trial.
+#
+# NOTE: Greedy plans aren't strictly guaranteed to get better with more capacity (eg. a story moving to an earlier sprint can leave a later story without room), so the answer is the smallest value the binary search finds that works -- it is always checked to work, but a smaller one could (rarely) exist.
+
+
+import argparse
+import lib
+import time
+import writers
+
+
+# Search for fractional capacities stops once the answer is known to within this many story points
+CAPACITY_PRECISION = 0.01
+
+
+class SearchBacklog:
+
+    def __init__(self, input_dict):
+
+        self.sprints = lib.load_sprint_data(input_dict)[0]
+        self.planner = lib.Planner(*lib.load_story_data(input_dict))
+
+        # Capacities each sprint was given in the input, that every trial's capacities are based on
+        self.input_total_capacities = [sprint.total_capacity for sprint in self.sprints]
+        self.input_assignee_total_capacities = [sprint.assignee_total_capacities for sprint in self.sprints]
+        self.input_capacities = list(zip(self.input_total_capacities, self.input_assignee_total_capacities))
+
+        # Sprints that have been added after the last sprint (by get_extra_sprints()), in order
+        self.extra_sprints = []
+
+        self.num_trials = 0
+
+    # Return the list of the first 'num_extra_sprints' extra sprints, creating any that don't exist yet
+    def get_extra_sprints(self, num_extra_sprints):
+
+        if num_extra_sprints and not self.sprints:
+            raise ValueError('Extra sprints are copies of the last sprint, so there must be at least one sprint!')
+
+        while len(self.extra_sprints) < num_extra_sprints:
+
+            last_sprint = self.extra_sprints[-1] if self.extra_sprints else self.sprints[-1]
+            start_date = last_sprint.end_date + lib.ONE_DAY
+            end_date = start_date + (self.sprints[-1].end_date - self.sprints[-1].start_date)
+            if end_date > lib.MAX_DATE:
+                raise OverflowError('date value out of range')
+
+            extra_sprint = lib.Sprint(start_date, end_date, self.input_total_capacities[-1], dict(self.input_assignee_total_capacities[-1]), 'Extra sprint {}'.format(len(self.extra_sprints) + 1), len(self.sprints) + len(self.extra_sprints) + 1)
+            self.extra_sprints.append(extra_sprint)
+
+        return self.extra_sprints[:num_extra_sprints]
+
+    # Plan the backlog with the given extra capacity in every sprint, the given extra capacity for the given assignee (in every sprint that limits their capacity), and the given number of extra sprints.
+    # Returns the list of sprints used, and the list of stories that could not be slotted into any sprint.
+    def plan(self, extra_capacity=0, assignee=None, extra_assignee_capacity=0, num_extra_sprints=0):
+
+        self.num_trials += 1
+
+        # Extra sprints get the same capacities as the last sprint
+        sprints = self.sprints + self.get_extra_sprints(num_extra_sprints)
+        input_capacities = self.input_capacities + self.input_capacities[-1:] * num_extra_sprints
+
+        for sprint, (input_total_capacity, input_assignee_capacities) in zip(sprints, input_capacities):
+
+            sprint.total_capacity = input_total_capacity + extra_capacity
+
+            sprint.assignee_total_capacities = input_assignee_capacities
+            if (assignee is not None) and (assignee in input_assignee_capacities):
+                sprint.assignee_total_capacities = dict(input_assignee_capacities)
+                sprint.assignee_total_capacities[assignee] += extra_assignee_capacity
+
+            sprint.reset()
+
+        return (sprints, self.planner.plan(sprints))
+
+    # Returns True if every story (or, if an assignee is given, every story of that assignee) gets slotted with the given plan() arguments
+    def is_feasible(self, assignee=None, **plan_args):
+        remaining_stories = self.plan(assignee=assignee, **plan_args)[1]
+        return not any((assignee is None) or (story.assignee == assignee) for story in remaining_stories)
+
+    # Return the smallest extra capacity in every sprint (or, if an assignee is given, for that assignee in every sprint that limits their capacity) that gets every story (of that assignee) slotted, or None if no amount of extra capacity would
+    def find_min_extra_capacity(self, assignee=None):
+
+        if assignee is None:
+            stories = self.planner.stories
+            capacities = self.input_total_capacities
+            is_feasible = lambda extra_capacity: self.is_feasible(extra_capacity=extra_capacity)
+        else:
+            stories = [story for story in self.planner.stories if story.assignee == assignee]
+            capacities = [assignee_capacities[assignee] for assignee_capacities in self.input_assignee_total_capacities if assignee in assignee_capacities]
+            if not capacities:
+                raise ValueError('No sprint limits the capacity of {} -- there is no assignee capacity to search for!'.format(assignee))
+            is_feasible = lambda extra_capacity: self.is_feasible(assignee=assignee, extra_assignee_capacity=extra_capacity)
+
+        if is_feasible(0):
+            return 0
+
+        # Enough extra capacity for every story to fit into any one sprint: if that's not enough, it's not down to (this) capacity -- eg. it's down to dates
+        max_extra_capacity = sum(story.size for story in stories) - min(min(capacities, default=0), 0)
+        if not is_feasible(max_extra_capacity):
+            return None
+
+        # Whole numbers of story points need whole numbers of capacity
+        sizes_and_capacities = [story.size for story in stories] + self.input_total_capacities + [capacity for assignee_capacities in self.input_assignee_total_capacities for capacity in assignee_capacities.values()]
+        is_integral = all(isinstance(value, int) for value in sizes_and_capacities)
+
+        # Invariant: low doesn't work, high does
+        low = 0
+        high = max_extra_capacity
+        while high - low > (1 if is_integral else CAPACITY_PRECISION):
+            middle = (low + high) // 2 if is_integral else (low + high) / 2
+            if is_feasible(middle):
+                high = middle
+            else:
+                low = middle
+
+        return high
+
+    # Return the smallest number of extra sprints that gets every story slotted, or None if no number of extra sprints would
+    def find_min_extra_sprints(self):
+
+        num_remaining_stories = len(self.plan()[1])
+        if not num_remaining_stories:
+            return 0
+
+        # Extra sprints that end before a story's start date can't be used for it, so count how many of them end before the latest start date of any story
+        first_extra_sprint = self.get_extra_sprints(1)[0]
+        sprint_period = first_extra_sprint.end_date - first_extra_sprint.start_date + lib.ONE_DAY
+        latest_start_date = max(story.start_date for story in self.planner.stories)
+        num_early_extra_sprints = max(-((first_extra_sprint.end_date - latest_start_date) // sprint_period), 0)
+
+        # Extra sprints can't go past the max possible date
+        max_extra_sprints = (lib.MAX_DATE - first_extra_sprint.end_date) // sprint_period + 1
+
+        # Double the number of extra sprints until it's enough, so that the binary search only covers a range around the answer (every trial with n extra sprints plans all n of them).
+        # More sprints at the end never unslot a story. Once the sprints being added are usable by every story (date-wise), they always get at least one more story slotted -- unless none of the remaining stories can ever be slotted (eg. because of their end dates, or stories too big for the last sprint), which is when to give up.
+        low = 0
+        high = 1
+        while True:
+
+            previous_num_remaining_stories = num_remaining_stories
+            num_remaining_stories = len(self.plan(num_extra_sprints=high)[1])
+            if not num_remaining_stories:
+                break
+
+            if (high >= max_extra_sprints) or ((low >= num_early_extra_sprints) and (num_remaining_stories == previous_num_remaining_stories)):
+                return None
+
+            low = high
+            high = min(high * 2, max_extra_sprints)
+
+        # Invariant: low doesn't work, high does
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.is_feasible(num_extra_sprints=middle):
+                high = middle
+            else:
+                low = middle
+
+        return high
+
+
+def parse_command_line_args():
+
+    arg_parser = argparse.ArgumentParser(argument_default='')
+
+    arg_parser.add_argument('--input')
+    arg_parser.add_argument('--search', default='capacity', choices=('capacity', 'assignee-capacity', 'sprints'), help='What to search for the minimum of: extra capacity per sprint, extra capacity per sprint for one assignee (see --assignee), or extra sprints (default: capacity)')
+    arg_parser.add_argument('--assignee', help='Assignee to search for the capacity of, for --search assignee-capacity')
+    arg_parser.add_argument('--output', help='Output file to save the plan that the minimum gives (default: none)')
+
+    args = arg_parser.parse_args()
+
+    if (args.search == 'assignee-capacity') != bool(args.assignee.strip()):
+        raise ValueError('--assignee must be given for (and only for) --search assignee-capacity!')
+
+    # For safety, remove any extraneous whitespace
+    return \
+        (
+            args.input.strip(),
+            args.search,
+            args.assignee.strip() or None,
+            args.output.strip()
+        )
+
+
+def main():
+
+    input_file_path, search, assignee, output_file_path = parse_command_line_args()
+
+    start_time = time.perf_counter()
+    backlog = SearchBacklog(lib.read_input_dict(input_file_path))
+
+    plan_args = {}
+    if search == 'sprints':
+        num_extra_sprints = backlog.find_min_extra_sprints()
+        if num_extra_sprints is None:
+            print('No number of extra sprints gets every story slotted (eg. because of their dates, or stories too big for the last sprint).')
+        else:
+            print('Min number of extra sprints: {}'.format(num_extra_sprints))
+            plan_args['num_extra_sprints'] = num_extra_sprints
+    else:
+        extra_capacity = backlog.find_min_extra_capacity(assignee)
+        if extra_capacity is None:
+            print('No amount of extra capacity gets every {}story slotted (eg. because of their dates{}).'.format('' if assignee is None else 'one of {}\'s '.format(assignee), '' if assignee is None else ', or the sprints\' total capacities'))
+        elif assignee is None:
+            print('Min extra capacity per sprint: {} (total capacity: {} -> {})'.format(extra_capacity, sum(backlog.input_total_capacities), sum(backlog.input_total_capacities) + extra_capacity * len(backlog.sprints)))
+            plan_args['extra_capacity'] = extra_capacity
+        else:
+            print('Min extra capacity for {} per sprint: {}'.format(assignee, extra_capacity))
+            plan_args.update(assignee=assignee, extra_assignee_capacity=extra_capacity)
+
+    print('({} trials in {:.2f}s)'.format(backlog.num_trials, time.perf_counter() - start_time))
+
+    # Save the plan that the answer gives
+    if output_file_path and plan_args:
+        writers.save_output(output_file_path, *backlog.plan(**plan_args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#! /usr/bin/env python3
+
+__author__ = 'Pranav Marla'
+
+
+# Long-running planner service: keeps inputs loaded (with their stories already normalized and sorted), so that re-planning doesn't have to pay for starting the interpreter, parsing the input and printing the results every time.
+#
+# Eg. Start the service on localhost, with a couple of inputs already loaded (each one is named after its file -- eg. team-a, team-b):
+#   ./server.py team-a.json team-b.json --port 8765
+#
+# Every request is a POST with a JSON body, and every response is JSON:
+#   /load     {"name": "team-c", "path": "team-c.json"}                       Load (or reload) an input file...
+#   /load     {"name": "team-c", "input": {"sprints": [...], "stories": [...]}} ...or an input given in the request itself
+#   /plan     {"name": "team-a"}                                              Plan an input -- returns the same structure as output.json
+#   /update   {"name": "team-a", "stories": [...], "removed": [...]}          Apply a delta (in the same format as main.py --delta) to an input, and return its new plan
+#   /unload   {"name": "team-a"}                                              Forget an input
+# A GET to /inputs returns the names of the loaded inputs.
+#
+# Requests are handled concurrently, but each plan is isolated from every other request: plans of the same input take turns, and an update only replaces an input once its new version is fully loaded (any plans already running finish on the old version).
+
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import incremental
+import json
+import lib
+import os
+import threading
+
+
+# A loaded input, with everything that can be reused across plans.
+# Never modified after it's loaded (except by planning, while holding its lock) -- updating an input creates a new LoadedInput instead.
+class LoadedInput:
+
+    def __init__(self, input_dict):
+
+        self.input_dict = input_dict
+        self.sprints = lib.load_sprint_data(input_dict)[0]
+        self.planner = lib.Planner(*lib.load_story_data(input_dict))
+
+        # Planning modifies the sprints and stories, so only one plan of this input can run at a time
+        self.lock = threading.Lock()
+
+    # Plan this input, and return the same dictionary that main.py saves to output.json
+    def plan(self):
+
+        with self.lock:
+
+            for sprint in self.sprints:
+                sprint.reset()
+
+            remaining_stories = self.planner.plan(self.sprints)
+            return lib.create_output_dict(self.sprints, remaining_stories)
+
+
+class PlannerService:
+
+    def __init__(self):
+
+        # Dictionary mapping name to LoadedInput
+        self.loaded_inputs = {}
+
+        # Loading, updating and unloading inputs replace entries of 'self.loaded_inputs', so they take turns (planning never needs this lock)
+        self.lock = threading.Lock()
+
+    def get_loaded_input(self, name):
+
+        loaded_input = self.loaded_inputs.get(name)
+        if loaded_input is None:
+            raise KeyError('input {} (it is not loaded)'.format(name))
+
+        return loaded_input
+
+    def load(self, params):
+
+        if 'input' in params:
+            input_dict = params['input']
+            if not isinstance(input_dict, dict):
+                raise ValueError('The input has to be a JSON object!')
+        else:
+            input_dict = lib.read_input_dict(params.get('path', ''))
+
+        loaded_input = LoadedInput(input_dict)
+        with self.lock:
+            self.loaded_inputs[params['name']] = loaded_input
+
+        return {'name': params['name'], 'sprints': len(loaded_input.sprints), 'stories': len(loaded_input.planner.stories)}
+
+    def plan(self, params):
+        return self.get_loaded_input(params['name']).plan()
+
+    def update(self, params):
+
+        with self.lock:
+            loaded_input = LoadedInput(incremental.apply_delta(self.get_loaded_input(params['name']).input_dict, params))
+            self.loaded_inputs[params['name']] = loaded_input
+
+        return loaded_input.plan()
+
+    def unload(self, params):
+
+        with self.lock:
+            self.get_loaded_input(params['name'])
+            del self.loaded_inputs[params['name']]
+
+        return {'name': params['name']}
+
+    def list_inputs(self):
+        return {'inputs': sorted(self.loaded_inputs)}
+
+
+class PlannerRequestHandler(BaseHTTPRequestHandler):
+
+    # Set by serve()
+    service = None
+
+    def do_GET(self):
+
+        if self.path == '/inputs':
+            self.send_json(200, self.service.list_inputs())
+        else:
+            self.send_json(404, {'error': 'Unknown path {}'.format(self.path)})
+
+    def do_POST(self):
+
+        methods = \
+            {
+                '/load': self.service.load,
+                '/plan': self.service.plan,
+                '/update': self.service.update,
+                '/unload': self.service.unload
+            }
+
+        method = methods.get(self.path)
+        if method is None:
+            self.send_json(404, {'error': 'Unknown path {}'.format(self.path)})
+            return
+
+        try:
+            params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or '{}')
+            if not isinstance(params, dict):
+                raise ValueError('The request body has to be a JSON object!')
+            if 'name' not in params:
+                raise ValueError('No input name provided!')
+            result = method(params)
+
+        # Unknown input names, and inputs or deltas that are missing a required key, raise KeyErrors
+        except KeyError as e:
+            self.send_json(400, {'error': 'Missing {}'.format(e.args[0]) if e.args else str(e)})
+        # Values of the wrong type (eg. a story size that isn't a number, or a prerequisite_for that isn't a list) raise TypeErrors or AttributeErrors
+        except (ValueError, TypeError, AttributeError, OverflowError, OSError) as e:
+            self.send_json(400, {'error': str(e)})
+        else:
+            self.send_json(200, result)
+
+    def send_json(self, status, response_dict):
+
+        # Same structure as output.json, but compact -- nobody is going to read it by eye
+        body = json.dumps(response_dict, separators=(',', ':')).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Only log errors, rather than every request
+    def log_request(self, code='-', size='-'):
+        if isinstance(code, int) and (code >= 400):
+            super().log_request(code, size)
+
+
+def parse_command_line_args():
+
+    arg_parser = argparse.ArgumentParser(argument_default='')
+
+    arg_parser.add_argument('inputs', nargs='*', help='Input files to load on startup (each one is named after its file, without the extension)')
+    arg_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1, i.e. only this machine)')
+    arg_parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+
+    args = arg_parser.parse_args()
+
+    # For safety, remove any extraneous whitespace
+    return \
+        (
+            args.host.strip(),
+            args.port,
+            [input_file_path.strip() for input_file_path in args.inputs]
+        )
+
+
+# Start the service on the given host and port, with the given input files already loaded, and handle requests until interrupted
+def serve(host, port, input_file_paths=()):
+
+    service = PlannerService()
+    for input_file_path in input_file_paths:
+        service.load({'name': os.path.splitext(os.path.basename(input_file_path))[0], 'path': input_file_path})
+
+    PlannerRequestHandler.service = service
+    server = ThreadingHTTPServer((host, port), PlannerRequestHandler)
+    print('Planning {} on http://{}:{}'.format(', '.join(service.list_inputs()['inputs']) or 'no inputs yet', host, server.server_address[1]))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    serve(*parse_command_line_args())
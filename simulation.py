@@ -0,0 +1,306 @@
+#! /usr/bin/env python3
+
+__author__ = 'Pranav Marla'
+
+
+# Monte Carlo schedule risk: story sizes are only estimates, so re-plan the backlog thousands of times with randomly sampled sizes, and report how likely each story is to land in each sprint, and to miss its deadline.
+#
+# Eg. Simulate 10,000 plans, where each story's size can be up to 30% smaller or bigger than its estimate:
+#   ./simulation.py --input backlog.json --trials 10000 --size-spread 0.3
+#
+# Each story's size is sampled from a triangular distribution, peaking at its estimated size:
+#   - Between the values of the story's own "size_range" (eg. "size_range": [2, 8]), if it has one
+#   - Otherwise, between (1 - spread) and (1 + spread) times its size, for the global --size-spread
+#
+# A story misses its deadline if it has an end date, and it either isn't slotted at all, or it's slotted into a sprint that ends after its end date.
+#
+# The results (saved to risk.json by default) list every story, in the order they are slotted, with the probability of it landing in each sprint (or in none), and of it missing its deadline.
+#
+# Every trial is planned exactly the way lib.slot_stories() would plan it (so a spread of 0 reproduces the regular plan), but all the trials are slotted at once, one story at a time:
+# Stories are populated with their children, normalized and sorted just once, by their estimated sizes -- i.e. every trial works through the backlog in the same order, and only the actual sizes of its stories differ.
+# The capacities of every sprint in every trial are held in (sprints x trials) NumPy arrays, so each story looks at its candidate sprints in order, a whole row of trials at a time, until every trial has found its sprint.
+
+
+import argparse
+from bisect import bisect_left
+from collections import OrderedDict
+import json
+import lib
+
+# NumPy is only needed for simulations, so don't require it to be installed unless a simulation is actually run
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Trials are simulated in chunks of (at most) this many, to bound the memory used by the (sprints x trials) arrays
+TRIALS_PER_CHUNK = 10000
+
+# Story sizes are sampled for this many stories at a time
+STORIES_PER_SAMPLE_BATCH = 256
+
+
+# The parts of a backlog that every trial shares: the stories (populated with their children, normalized and sorted), their size distributions, and the sprints
+class SimulationBacklog:
+
+    def __init__(self, input_dict, size_spread=0):
+
+        if np is None:
+            raise ImportError('Simulations require NumPy to be installed (eg. pip install numpy)!')
+
+        if not (0 <= size_spread < 1):
+            raise ValueError('Size spread must be at least 0, and less than 1!')
+
+        self.sprints = lib.load_sprint_data(input_dict)[0]
+
+        stories, id_to_story_dict = lib.load_story_data(input_dict)
+
+        # Stories are about to be sorted, so remember which story came from which dictionary (for their size ranges and original end dates)
+        story_dicts = {id(story): story_dict for story, story_dict in zip(stories, input_dict['stories'])}
+
+        self.stories = lib.Planner(stories, id_to_story_dict).stories
+        story_positions = {id(story): position for position, story in enumerate(self.stories)}
+
+        # Triangular size distribution of each story: (min, most likely, max)
+        self.size_modes = np.array([story.size for story in self.stories], dtype=float)
+        self.size_lows = self.size_modes * (1 - size_spread)
+        self.size_highs = self.size_modes * (1 + size_spread)
+        for position, story in enumerate(self.stories):
+            size_range = story_dicts[id(story)].get('size_range')
+            if size_range is not None:
+                low, high = size_range
+                if not (0 <= low <= story.size <= high):
+                    raise ValueError('Story {} has a size range of {}: it must contain the story\'s size ({}), and can\'t be negative!'.format(story.id, size_range, story.size))
+                self.size_lows[position] = low
+                self.size_highs[position] = high
+        self.size_lows = np.maximum(self.size_lows, 0)
+
+        # Position of the last story that could be of size 0 in some trial (-1 if none can)
+        zero_size_positions = np.flatnonzero(self.size_lows <= 0)
+        self.last_zero_size_position = zero_size_positions[-1] if len(zero_size_positions) else -1
+
+        # End date that each story must be done by (i.e. the one it was given in the input, rather than its normalized one), or None if it has none
+        self.deadlines = [lib.convert_str_to_day(story_dicts[id(story)]['end_date']) if 'end_date' in story_dicts[id(story)] else None for story in self.stories]
+
+        # Positions of each story's children (which, thanks to normalization and sorting, always come after it)
+        self.child_positions = [[story_positions[id(child)] for child in story.children] for story in self.stories]
+
+    # Simulate the given number of trials, and return:
+    #   - A (stories x (sprints + 1)) array of the number of trials in which each story landed in each sprint, where the last column is the number of trials in which the story wasn't slotted
+    #   - An array of the number of trials in which each story missed its deadline
+    def simulate(self, num_trials, seed=0):
+
+        rng = np.random.default_rng(seed)
+
+        num_sprints = len(self.sprints)
+        landing_counts = np.zeros((len(self.stories), num_sprints + 1), dtype=np.int64)
+        deadline_miss_counts = np.zeros(len(self.stories), dtype=np.int64)
+
+        for chunk_start in range(0, num_trials, TRIALS_PER_CHUNK):
+            self.slot_trials(rng, min(TRIALS_PER_CHUNK, num_trials - chunk_start), landing_counts, deadline_miss_counts)
+
+        return (landing_counts, deadline_miss_counts)
+
+    # Return a (stories x trials) array of sampled sizes, for the stories at the given positions (a slice)
+    def sample_sizes(self, rng, positions, num_trials):
+
+        size_modes = self.size_modes[positions]
+        size_lows = self.size_lows[positions]
+        size_highs = self.size_highs[positions]
+
+        sizes = np.repeat(size_modes[:, None], num_trials, axis=1)
+
+        # Only sample the stories whose size is actually uncertain (numpy can't sample a triangular distribution with no width anyway)
+        uncertain_positions = np.flatnonzero(size_lows < size_highs)
+        if len(uncertain_positions):
+            sizes[uncertain_positions] = rng.triangular(size_lows[uncertain_positions, None], size_modes[uncertain_positions, None], size_highs[uncertain_positions, None], size=(len(uncertain_positions), num_trials))
+
+        return sizes
+
+    # Slot every story into each of the given number of trials (with freshly sampled sizes), exactly as lib.slot_stories() would, and add the results to the given counts
+    def slot_trials(self, rng, num_trials, landing_counts, deadline_miss_counts, max_date=lib.MAX_DATE):
+
+        sprints = self.sprints
+        num_sprints = len(sprints)
+
+        sprint_start_dates = np.array([sprint.start_date for sprint in sprints], dtype=np.int64)
+        sprint_end_dates = [sprint.end_date for sprint in sprints]
+
+        # Sprint dates indexed by each trial's sprint position for a story, where position num_sprints means that the story wasn't slotted
+        slotted_start_dates = np.append(sprint_start_dates, max_date)
+        slotted_end_dates = np.append(np.array(sprint_end_dates, dtype=np.int64), max_date)
+
+        # Available capacity of each sprint (row), in each trial (column)
+        capacities = np.repeat(np.array([sprint.available_capacity for sprint in sprints], dtype=float)[:, None], num_trials, axis=1)
+
+        # Max available capacity of each sprint, over all the trials: a story never needs to look at sprints that it can't fit into in any trial
+        max_capacities = capacities.max(axis=1, initial=-lib.UNLIMITED_CAPACITY)
+
+        # Available capacity of each assignee, in each sprint, in each trial (unlimited in sprints that don't limit their capacity, just like in lib.SprintIndex)
+        assignee_capacities = {}
+        for assignee in set().union(*(sprint.assignee_available_capacities for sprint in sprints)):
+            assignee_capacities[assignee] = np.repeat(np.array([sprint.assignee_available_capacities.get(assignee, lib.UNLIMITED_CAPACITY) for sprint in sprints], dtype=float)[:, None], num_trials, axis=1)
+
+        # Sprints that slot_stories() has given up on, in each trial (see lib.SprintIndex.remove_full_sprints_before()).
+        # Only full sprints are ever given up on, and they're full for good, so this only makes a difference to stories of size 0: it isn't kept up to date once the last story that could be of size 0 has been slotted.
+        given_up = np.zeros((num_sprints, num_trials), dtype=bool)
+        sprint_positions = np.arange(num_sprints)[:, None]
+
+        # Start date of each story in each trial, for the stories whose start dates have been moved later by their parents -- the equivalent of lib.slot_stories()'s earliest sprint positions, since the sprints are sorted by end date
+        adjusted_start_dates = {}
+
+        for position, story in enumerate(self.stories):
+
+            # Sizes are sampled a batch of stories at a time, to bound the memory they use
+            batch_offset = position % STORIES_PER_SAMPLE_BATCH
+            if batch_offset == 0:
+                batch_sizes = self.sample_sizes(rng, slice(position, position + STORIES_PER_SAMPLE_BATCH), num_trials)
+            story_sizes = batch_sizes[batch_offset]
+
+            is_given_up_needed = position <= self.last_zero_size_position
+            start_dates = adjusted_start_dates.pop(position, None)
+            story_assignee_capacities = assignee_capacities.get(story.assignee)
+
+            # Position of the sprint that the story is slotted into, in each trial (num_sprints if it isn't slotted)
+            end_positions = np.full(num_trials, num_sprints)
+            is_unresolved = np.ones(num_trials, dtype=bool)
+
+            # Sprints skipped in each trial because the assignee didn't have enough capacity in them
+            assignee_skipped_sprints = {}
+
+            # Only look at the sprints that are (in at least one trial) within the story's dates, and that the story can fit into in at least one trial -- in order, until every trial has found its sprint
+            first_sprint = bisect_left(sprint_end_dates, story.start_date if start_dates is None else int(start_dates.min()))
+            candidate_sprints = np.flatnonzero((sprint_start_dates[first_sprint:] <= story.end_date) & (max_capacities[first_sprint:] >= story_sizes.min())) + first_sprint
+
+            for sprint_position in candidate_sprints.tolist():
+
+                sprint_capacities = capacities[sprint_position]
+                is_open = sprint_capacities >= story_sizes
+                if is_given_up_needed:
+                    is_open &= ~given_up[sprint_position]
+
+                # Unless the story's start date was moved later by its parents, every candidate sprint already ends on or after it
+                if start_dates is not None:
+                    is_open &= start_dates <= sprint_end_dates[sprint_position]
+
+                is_feasible = is_open
+                if story_assignee_capacities is not None:
+                    has_assignee_capacity = story_assignee_capacities[sprint_position] >= story_sizes
+                    if is_given_up_needed:
+                        assignee_skipped_sprints[sprint_position] = is_open & ~has_assignee_capacity
+                    is_feasible = is_open & has_assignee_capacity
+
+                is_slotted_here = is_feasible & is_unresolved
+                if not is_slotted_here.any():
+                    continue
+
+                np.putmask(end_positions, is_slotted_here, sprint_position)
+                is_unresolved ^= is_slotted_here
+
+                # (Cheaper than subtracting the sizes of just the trials the story was slotted into)
+                slotted_sizes = story_sizes * is_slotted_here
+                sprint_capacities -= slotted_sizes
+                max_capacities[sprint_position] = sprint_capacities.max()
+                if story_assignee_capacities is not None:
+                    story_assignee_capacities[sprint_position] -= slotted_sizes
+
+                if not is_unresolved.any():
+                    break
+
+            is_slotted = ~is_unresolved
+
+            # Every full sprint before the one the story ended up in (or all of them, if it wasn't slotted) is given up on -- except for those that were skipped because of their assignee capacity (only possible for stories of size 0)
+            if is_given_up_needed:
+                newly_given_up = (capacities == 0) & (sprint_positions < end_positions)
+                for sprint_position, is_assignee_skipped in assignee_skipped_sprints.items():
+                    newly_given_up[sprint_position] &= ~is_assignee_skipped
+                given_up |= newly_given_up
+
+            # Tally up where the story landed
+            landing_counts[position] += np.bincount(end_positions, minlength=num_sprints + 1)
+
+            deadline = self.deadlines[position]
+            if deadline is not None:
+                deadline_miss_counts[position] += np.count_nonzero(~is_slotted | (slotted_end_dates[end_positions] > deadline))
+
+            # Make sure that, in each trial, none of the story's children can be slotted before it (or at all, if it wasn't slotted)
+            if self.child_positions[position]:
+                earliest_start_dates_for_children = slotted_start_dates[end_positions]
+                for child_position in self.child_positions[position]:
+                    child_start_dates = adjusted_start_dates.get(child_position)
+                    if child_start_dates is None:
+                        child_start_dates = np.full(num_trials, self.stories[child_position].start_date, dtype=np.int64)
+                    adjusted_start_dates[child_position] = np.maximum(child_start_dates, earliest_start_dates_for_children)
+
+
+# Return a dictionary describing the simulation results (as saved to the results file), given the backlog and the counts returned by SimulationBacklog.simulate()
+def create_risk_dict(backlog, landing_counts, deadline_miss_counts, num_trials):
+
+    stories_list = []
+    for position, story in enumerate(backlog.stories):
+
+        story_dict = OrderedDict()
+        story_dict['id'] = story.id
+
+        # Only list the sprints the story actually landed in, in at least one trial
+        story_dict['sprints'] = OrderedDict((sprint.id, int(landing_counts[position, sprint_position]) / num_trials) for sprint_position, sprint in enumerate(backlog.sprints) if landing_counts[position, sprint_position])
+        story_dict['remaining'] = int(landing_counts[position, -1]) / num_trials
+
+        if backlog.deadlines[position] is not None:
+            story_dict['deadline_miss'] = int(deadline_miss_counts[position]) / num_trials
+
+        stories_list.append(story_dict)
+
+    return OrderedDict([('trials', num_trials), ('stories', stories_list)])
+
+
+def parse_command_line_args():
+
+    arg_parser = argparse.ArgumentParser(argument_default='')
+
+    arg_parser.add_argument('--input')
+    arg_parser.add_argument('--trials', type=int, default=10000, help='Number of plans to simulate (default: 10000)')
+    arg_parser.add_argument('--size-spread', type=float, default=0, help="How far each story's actual size can be from its estimate, as a fraction of it (less than 1), for stories without their own size_range (default: 0, i.e. exact)")
+    arg_parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    arg_parser.add_argument('--output', help='Results file (default: risk.json)')
+
+    args = arg_parser.parse_args()
+
+    if args.trials <= 0:
+        raise ValueError('Number of trials must be positive!')
+
+    # For safety, remove any extraneous whitespace
+    return \
+        (
+            args.input.strip(),
+            args.trials,
+            args.size_spread,
+            args.seed,
+            args.output.strip() or 'risk.json'
+        )
+
+
+def main():
+
+    input_file_path, num_trials, size_spread, seed, output_file_path = parse_command_line_args()
+
+    backlog = SimulationBacklog(lib.read_input_dict(input_file_path), size_spread)
+    landing_counts, deadline_miss_counts = backlog.simulate(num_trials, seed)
+    risk_dict = create_risk_dict(backlog, landing_counts, deadline_miss_counts, num_trials)
+
+    # Show the stories most likely to miss their deadlines
+    at_risk_story_dicts = sorted((story_dict for story_dict in risk_dict['stories'] if story_dict.get('deadline_miss')), key=lambda story_dict: -story_dict['deadline_miss'])
+    if at_risk_story_dicts:
+        print('Stories most likely to miss their deadlines (out of {} trials):'.format(num_trials))
+        for story_dict in at_risk_story_dicts[:20]:
+            print('\t{}:\t{:.1%}'.format(story_dict['id'], story_dict['deadline_miss']))
+    else:
+        print('No story missed its deadline in any of the {} trials.'.format(num_trials))
+
+    with open(output_file_path, 'w') as output_file:
+        output_file.write(json.dumps(risk_dict, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+#! /usr/bin/env python3
+
+__author__ = 'Pranav Marla'
+
+
+# Plans inputs with several teams (or sprint tracks), each with its own sprints, in parallel.
+#
+# The input file looks like this:
+#   {
+#       "teams":
+#       [
+#           {"name": "team-a", "sprints": [...], "stories": [...]},
+#           {"name": "team-b", "sprints": [...], "stories": [...]}
+#       ]
+#   }
+# where each team's sprints and stories are in the same format as a regular input file, and a team's stories are only ever slotted into that team's sprints.
+# Story IDs are shared by all the teams, so a story can be a prerequisite for stories of other teams (such a story still gets slotted before the stories that depend on it, by date).
+#
+# Eg. ./teams.py --input org.json --output org-output.json
+#
+# The output file maps each team's name (in the same order as the input) to that team's results, in the same format as main.py's output.json.
+#
+# Planning is split up by the connected components of the dependency graph: components that span several teams tie those teams' plans together, so those teams are planned together, in a single process.
+# Every other team is planned on its own, in parallel -- and gets exactly the same plan as it would if it was the only team in the input.
+# (The components within a single team can't be planned separately, since they all compete for the same sprints.)
+
+
+import argparse
+from collections import OrderedDict
+import json
+import lib
+import multiprocessing
+
+
+# The input being planned.
+# It is loaded in the main process before the worker processes are started so that, where processes are forked (eg. Linux), the workers inherit it (copy-on-write) instead of having to be sent their teams.
+input_dict = None
+
+
+def load_input(input_file_path):
+
+    global input_dict
+
+    input_dict = lib.read_input_dict(input_file_path)
+
+    if 'teams' not in input_dict:
+        raise ValueError('Input file {} has no teams -- use main.py for inputs with a single list of sprints!'.format(input_file_path))
+
+    team_names = [team_dict['name'] for team_dict in input_dict['teams']]
+    if len(set(team_names)) != len(team_names):
+        raise ValueError('Every team must have a different name!')
+
+
+# Worker process initializer: only needed where worker processes are not forked, and thus don't already have the input loaded
+def initialize_worker(input_file_path):
+    if input_dict is None:
+        load_input(input_file_path)
+
+
+# Given the list of team dictionaries from the input, return the groups of teams that have to be planned together, as lists of team positions (in ascending order, with the groups ordered by their first team).
+# Teams end up in the same group if any connected component of the dependency graph contains stories from each of them (i.e. if a story of one team is a prerequisite for a story of the other, directly or indirectly).
+def find_team_groups(team_dicts):
+
+    # Dictionary mapping story ID to the position of its team
+    id_to_team_position_dict = {}
+    for team_position, team_dict in enumerate(team_dicts):
+        for story_dict in team_dict['stories']:
+            previous_team_position = id_to_team_position_dict.setdefault(story_dict['id'], team_position)
+            if previous_team_position != team_position:
+                raise ValueError('Story {} belongs to more than one team ({} and {})!'.format(story_dict['id'], team_dicts[previous_team_position]['name'], team_dict['name']))
+
+    # Union-find over the teams: every dependency between stories of two different teams joins their teams' components (and thus their groups)
+    parent_team_positions = list(range(len(team_dicts)))
+
+    def find_root(team_position):
+        while parent_team_positions[team_position] != team_position:
+            parent_team_positions[team_position] = parent_team_positions[parent_team_positions[team_position]]
+            team_position = parent_team_positions[team_position]
+        return team_position
+
+    for team_position, team_dict in enumerate(team_dicts):
+        for story_dict in team_dict['stories']:
+            for child_id in story_dict.get('prerequisite_for', ()):
+                if child_id not in id_to_team_position_dict:
+                    raise ValueError('Story {} is a prerequisite for story {}, which is not in any team!'.format(story_dict['id'], child_id))
+                root = find_root(team_position)
+                child_root = find_root(id_to_team_position_dict[child_id])
+                if root != child_root:
+                    parent_team_positions[max(root, child_root)] = min(root, child_root)
+
+    team_groups = OrderedDict()
+    for team_position in range(len(team_dicts)):
+        team_groups.setdefault(find_root(team_position), []).append(team_position)
+
+    return list(team_groups.values())
+
+
+# Worker function: plan the given group of teams together.
+# Returns the list of (team position, output dictionary) pairs for the group's teams, where each output dictionary is in the same format as main.py's output.json.
+def plan_team_group(team_positions):
+
+    team_dicts = [input_dict['teams'][team_position] for team_position in team_positions]
+
+    # Stories of every team in the group, in the order they appear in the input (team by team), just as if they were all in one input file
+    stories = []
+    id_to_story_dict = {}
+
+    # Dictionary mapping the (Python) identity of each story to the position of its team within the group
+    story_team_positions = {}
+
+    team_sprints = []
+    for team_position, team_dict in enumerate(team_dicts):
+
+        team_stories, team_id_to_story_dict = lib.load_story_data(team_dict)
+        stories.extend(team_stories)
+        id_to_story_dict.update(team_id_to_story_dict)
+        for story in team_stories:
+            story_team_positions[id(story)] = team_position
+
+        team_sprints.append(lib.load_sprint_data(team_dict)[0])
+
+    lib.populate_children_from_ids(stories, id_to_story_dict)
+    lib.normalize_stories(stories)
+    lib.sort_stories(stories)
+
+    team_remaining_stories = slot_team_stories(stories, story_team_positions, team_sprints)
+
+    return [(team_position, lib.create_output_dict(sprints, remaining_stories)) for team_position, sprints, remaining_stories in zip(team_positions, team_sprints, team_remaining_stories)]
+
+
+# Equivalent to lib.slot_stories(), except that each story is only slotted into the sprints of its own team (given by 'story_team_positions').
+# Returns the list of stories that could not be slotted into any sprint, for each team.
+# For a single team, this gives exactly the same results as lib.slot_stories().
+def slot_team_stories(stories, story_team_positions, team_sprints, max_date=lib.MAX_DATE):
+
+    sprint_indexes = [lib.SprintIndex(sprints, max_date) for sprints in team_sprints]
+    team_remaining_stories = [[] for sprints in team_sprints]
+
+    for story in stories:
+
+        team_position = story_team_positions[id(story)]
+        sprints = team_sprints[team_position]
+        sprint_index = sprint_indexes[team_position]
+
+        # Once all of a team's sprints are full, don't bother trying to slot the rest of its stories
+        position = None
+        if sprint_index.num_available_sprints:
+            position = lib.slot_story(story.size, story.start_date, story.end_date, story.assignee, sprints, sprint_index)
+
+        if position is None:
+            team_remaining_stories[team_position].append(story)
+            earliest_start_date_for_children = max_date
+        else:
+            sprint = sprints[position]
+            sprint.stories.append(story)
+            story.assigned_sprint_id = sprint.id
+            earliest_start_date_for_children = sprint.start_date
+
+        # Just like in lib.slot_stories(), make sure that no child (whichever team it belongs to) ends up in a sprint before this story's sprint, or in any sprint at all if this story wasn't slotted
+        for child in story.children:
+            if child.start_date < earliest_start_date_for_children:
+                child.start_date = earliest_start_date_for_children
+
+    return team_remaining_stories
+
+
+def parse_command_line_args():
+
+    arg_parser = argparse.ArgumentParser(argument_default='')
+
+    arg_parser.add_argument('--input', help='Input file with several teams')
+    arg_parser.add_argument('--output', help='Output file (default: output.json)')
+    arg_parser.add_argument('--workers', type=int, default=0, help='Number of worker processes (default: the number of CPUs)')
+
+    args = arg_parser.parse_args()
+
+    # For safety, remove any extraneous whitespace
+    return \
+        (
+            args.input.strip(),
+            args.output.strip() or 'output.json',
+            args.workers
+        )
+
+
+def main():
+
+    input_file_path, output_file_path, num_workers = parse_command_line_args()
+
+    load_input(input_file_path)
+    team_dicts = input_dict['teams']
+    team_groups = find_team_groups(team_dicts)
+
+    for team_positions in team_groups:
+        if len(team_positions) > 1:
+            print('Planning together, since their stories depend on each other: {}'.format(', '.join(team_dicts[team_position]['name'] for team_position in team_positions)))
+
+    # Fork where possible, so that the workers inherit the input that's already been loaded
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+
+    team_output_dicts = [None] * len(team_dicts)
+    with context.Pool(num_workers or None, initializer=initialize_worker, initargs=(input_file_path,)) as pool:
+
+        # Biggest groups first, so that they don't end up holding up the end of the run
+        team_groups.sort(key=lambda team_positions: -sum(len(team_dicts[team_position]['stories']) for team_position in team_positions))
+
+        for group_results in pool.imap_unordered(plan_team_group, team_groups):
+            for team_position, team_output_dict in group_results:
+                team_output_dicts[team_position] = team_output_dict
+
+    # Merge the results in the same order as the teams in the input, no matter which group finished first
+    output_dict = OrderedDict((team_dict['name'], team_output_dict) for team_dict, team_output_dict in zip(team_dicts, team_output_dicts))
+
+    for team_name, team_output_dict in output_dict.items():
+        num_slotted_stories = sum(len(value['Stories']) for key, value in team_output_dict.items() if key != 'Remaining')
+        print('{}:\tslotted {} stories ({} stories could not be slotted into any sprint)'.format(team_name, num_slotted_stories, len(team_output_dict['Remaining'])))
+
+    with open(output_file_path, 'w') as output_file:
+        output_file.write(json.dumps(output_dict, indent=4))
+
+
+if __name__ == '__main__':
+    main()
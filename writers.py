@@ -0,0 +1,93 @@
+__author__ = 'Pranav Marla'
+
+
+# Writers that save the results of a plan to a file, one sprint at a time, instead of first building the whole output (and then the whole JSON string) in memory.
+# Every writer writes the sprints in the same order as output.json (i.e. the order of lib.iterate_output_items()), followed by the remaining stories.
+#
+# Formats:
+#   json:         Exactly the same as the original output.json (indented)
+#   compact-json: The same structure as output.json, without any whitespace
+#   ndjson:       One line per sprint -- {"Sprint": <ID>, "Stories": [...], "Assignee Workload": {...}} -- followed by a final line with the remaining stories -- {"Remaining": [...]}
+#   csv:          One row per story (Sprint, Story), in the same order as output.json, where the sprint of the remaining stories is "Remaining"
+
+
+import csv
+import json
+import lib
+
+
+def write_json_output(output_file, sprints, remaining_stories, indent=4):
+
+    # Match json.dumps(), both with and without indentation
+    if indent is None:
+        separators = (',', ':')
+        newline = ''
+    else:
+        separators = (',', ': ')
+        newline = '\n' + ' ' * indent
+
+    output_file.write('{')
+
+    item_separator = ''
+    for key, value in lib.iterate_output_items(sprints, remaining_stories):
+
+        # Every line of a nested value has to be indented one level further
+        value_json = json.dumps(value, indent=indent, separators=separators)
+        if indent is not None:
+            value_json = value_json.replace('\n', newline)
+
+        output_file.write('{}{}{}{}{}'.format(item_separator, newline, json.dumps(str(key)), separators[1], value_json))
+        item_separator = separators[0]
+
+    output_file.write('\n}' if indent is not None else '}')
+
+
+def write_compact_json_output(output_file, sprints, remaining_stories):
+    write_json_output(output_file, sprints, remaining_stories, indent=None)
+
+
+def write_ndjson_output(output_file, sprints, remaining_stories):
+
+    for key, value in lib.iterate_output_items(sprints, remaining_stories):
+
+        if key == 'Remaining':
+            line_dict = {'Remaining': value}
+        else:
+            line_dict = {'Sprint': key}
+            line_dict.update(value)
+
+        output_file.write(json.dumps(line_dict, separators=(',', ':')))
+        output_file.write('\n')
+
+
+def write_csv_output(output_file, sprints, remaining_stories):
+
+    csv_writer = csv.writer(output_file)
+    csv_writer.writerow(('Sprint', 'Story'))
+
+    for key, value in lib.iterate_output_items(sprints, remaining_stories):
+        story_ids = value if key == 'Remaining' else value['Stories']
+        csv_writer.writerows((key, story_id) for story_id in story_ids)
+
+
+# Dictionary mapping each output format to its writer, and the extension of the files it writes
+OUTPUT_FORMATS = \
+    {
+        'json': (write_json_output, '.json'),
+        'compact-json': (write_compact_json_output, '.json'),
+        'ndjson': (write_ndjson_output, '.ndjson'),
+        'csv': (write_csv_output, '.csv')
+    }
+
+
+# Save the results of a plan to the given file, in the given format (one of OUTPUT_FORMATS)
+def save_output(output_file_path, sprints, remaining_stories, output_format='json'):
+
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError('Unknown output format {} -- must be one of: {}'.format(output_format, ', '.join(OUTPUT_FORMATS)))
+
+    write_output = OUTPUT_FORMATS[output_format][0]
+
+    # The csv module does its own line endings
+    with open(output_file_path, 'w', newline='' if output_format == 'csv' else None) as output_file:
+        write_output(output_file, sprints, remaining_stories)